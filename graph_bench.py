@@ -0,0 +1,158 @@
+#! /usr/bin/python3
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import graph_run
+import graph_types
+
+# Families scaling graph2 and graph3 of main.py: a chain of npt nodes, node i has the var
+# (and in the 'jumps' family the jump +) of its residue k modulo the period and refers
+# to the shared leaves of k - 1 and k, which carry the same var (and the jump -). Each
+# node forgets the var of its parent, so only the first period of the chain is checked
+# for connects. traps adds transitions without the forget to every state, a random run
+# then succeeds with probability about (1 / (traps + 1)) ** period.
+
+
+def _leaf(k, period):
+    return '%dr' % (k % period + 1)
+
+
+def chain_graph(nodes, period=6):
+    graph = graph_types.Graph()
+    for i in range(1, nodes + 1):
+        k = (i - 1) % period
+        child = str(i + 1) if i < nodes else '0'
+        refs = ('0', _leaf(k, period)) if i == 1 else (_leaf(k - 1, period), _leaf(k, period))
+        graph.add_edge(str(i), 'npt', (child,) + refs)
+    for k in range(min(nodes, period)):
+        graph.add_edge(_leaf(k, period), str(k + 1), ())
+    graph.add_edge('0', '0', ())
+
+    return graph
+
+
+def chain_automaton(period=6, traps=0, jumps=False):
+    automaton = graph_types.GraphAutomaton()
+    for k in range(period):
+        state = 'q%d' % (k + 1)
+        var = {'v%d' % (k + 1)}
+        jump = {'j%d' % (k + 1)} if jumps else set()
+        forget = [{'v%d' % ((k - 1) % period + 1)}] + [set()] * traps
+        refs = [('q0', 'q1r')] if k == 0 else []
+        refs.append(('q%dr' % ((k - 1) % period + 1), 'q%dr' % (k + 1)))
+        for child in ['q%d' % ((k + 1) % period + 1), 'q0']:
+            for ref in refs:
+                for state_forget in forget:
+                    automaton.add_transition(state, 'npt', (child,) + ref, var, state_forget,
+                                             set(j + '+' for j in jump))
+        automaton.add_transition('q%dr' % (k + 1), str(k + 1), (), var, set(),
+                                 set(j + '-' for j in jump))
+    automaton.add_transition('q0', '0', (), set(), set(), set())
+
+    return automaton
+
+
+FAMILIES = {
+    'chain': lambda nodes, period, traps: (chain_graph(nodes, period),
+                                           chain_automaton(period, traps)),
+    'jumps': lambda nodes, period, traps: (chain_graph(nodes, period),
+                                           chain_automaton(period, traps, jumps=True)),
+}
+
+
+def measure(automaton, graph, attempts, seed=0, backend='python'):
+    # seconds spent labelling and verifying over the attempts up to the first accepted run
+    verify_connects, verify_jumps = graph_run.verifiers(backend)
+    rng = random.Random(seed)
+    stats = graph_run.RunStats()
+    result = {'accepted': False, 'label_failures': 0, 'connect_failures': 0}
+    while stats.attempts < attempts and not result['accepted']:
+        stats.attempts += 1
+        with stats.phase('label'):
+            try:
+                run = graph_run.label_run(automaton, graph, rng, stats=stats)
+            except graph_run.RunFailed:
+                run = None
+        if run is None:
+            result['label_failures'] += 1
+            continue
+
+        with stats.phase('connects'):
+            connects = verify_connects(graph, run, stats)
+        if not connects:
+            result['connect_failures'] += 1
+            continue
+
+        with stats.phase('jumps'):
+            result['accepted'] = verify_jumps(graph, run, stats)
+
+    result.update(attempts=stats.attempts, candidates=stats.candidates)
+    for phase in ['label', 'connects', 'jumps']:
+        result[phase + '_s'] = stats.seconds[phase]
+        if phase != 'label':
+            result[phase + '_visited'] = stats.visited[phase]
+
+    return result
+
+
+def peak_memory(automaton, graph, attempts, seed=0, backend='python'):
+    # peak bytes allocated by the same attempts as measure(), the graph and the automaton
+    # are allocated already
+    tracemalloc.start()
+    try:
+        measure(automaton, graph, attempts, seed, backend)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(family, nodes, period=6, traps=0, attempts=1000, seed=0, memory=True,
+          backend='python'):
+    start = time.perf_counter()
+    graph, automaton = FAMILIES[family](nodes, period, traps)
+    automaton.compile()
+    result = {'family': family, 'nodes': nodes, 'edges': graph.edge_count(), 'period': period,
+              'traps': traps, 'seed': seed, 'backend': backend,
+              'build_s': time.perf_counter() - start}
+    result.update(measure(automaton, graph, attempts, seed, backend))
+    result['total_s'] = result['label_s'] + result['connects_s'] + result['jumps_s']
+    result['peak_bytes'] = peak_memory(automaton, graph, attempts, seed, backend) \
+        if memory else None
+
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time labelling and verification of random "
+                                     "runs, one JSON object per line on stdout.")
+    parser.add_argument('--family', nargs='+', default=sorted(FAMILIES), choices=sorted(FAMILIES))
+    parser.add_argument('--nodes', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--period', type=int, default=6)
+    parser.add_argument('--traps', type=int, default=0)
+    parser.add_argument('--attempts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, nargs='+', default=[0])
+    parser.add_argument('--no-memory', dest='memory', action='store_false')
+    parser.add_argument('--backend', default='python', choices=['python', 'numpy'])
+    args = parser.parse_args(argv)
+
+    version = {'python': platform.python_version(), 'implementation':
+               platform.python_implementation()}
+    for family in args.family:
+        for nodes in args.nodes:
+            for seed in args.seed:
+                result = bench(family, nodes, args.period, args.traps, args.attempts, seed,
+                               args.memory, args.backend)
+                result.update(version)
+                print(json.dumps(result, sort_keys=True), flush=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
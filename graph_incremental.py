@@ -0,0 +1,280 @@
+#! /usr/bin/python3
+
+import collections
+import random
+
+import graph_run
+
+_Search = collections.namedtuple('_Search', ['result', 'partner', 'visited', 'paired'])
+
+
+def _search(cached, searches, key, paired, dirty, search):
+    # a search is repeated if it looked at a changed node or at a node paired
+    # differently, otherwise it would go the same way
+    found = cached.get(key)
+    if found is None or not found.visited.isdisjoint(dirty) \
+            or found.visited.intersection(paired) != found.paired:
+        visited = set()
+        result, partner = search(visited)
+        found = _Search(result, partner, visited, frozenset(visited.intersection(paired)))
+    searches[key] = found
+
+    return found
+
+
+def _on_cycle(graph, node):
+    # whether a non-empty path leads from the node to itself, searched down from the node
+    # and up from it in turns so that the search ends within the smaller of its
+    # descendants and ancestors
+    if len(graph.in_edges(node)) == 0:
+        return False
+
+    searches = [(graph.successors, collections.deque([node]), set()),
+                (graph.predecessors, collections.deque([node]), set())]
+    while True:
+        for neighbours, todo, seen in searches:
+            if len(todo) == 0:
+                return False
+            for neighbour in neighbours(todo.popleft()):
+                if neighbour == node:
+                    return True
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    todo.append(neighbour)
+
+
+# Keeps a run of an automaton over a graph that is edited through add_edge,
+# remove_edge and replace_edge. An edit relabels the edited node and those of its
+# ancestors whose children changed state, and repeats only the connect and jump
+# searches that looked at a relabelled or edited node. When the changed run is not
+# accepted the whole graph is labelled again by random runs as automaton_run does.
+# A node with a child without an edge keeps its labelling and waits for the child, so
+# graphs may be built edge by edge, accepted is False meanwhile.
+class IncrementalRun:
+    def __init__(self, automaton, graph, rng=random, attempts=1000, stats=None):
+        self._automaton = automaton
+        self._graph = graph
+        self._rng = rng
+        self._attempts = attempts
+        self._stats = stats
+        self._connects = {}  # (source, var bit) -> _Search
+        self._jumps = {}  # (source, jump bit) -> _Search
+        self._waiting = set()  # nodes with a child without an edge
+        self._items = collections.Counter()  # var and jump bits -> labellings having them
+        self._stale = False  # the run is left from failed attempts, not relabelled locally
+        self.run = graph_run.new_run(automaton, graph)
+        # a node is labelled after its children, so a first labelling closes no cycle
+        self.accepted = self._update([node for node in range(len(graph.node_ids))
+                                      if graph.has_node(node)], False)
+
+    @property
+    def graph(self):
+        return self._graph
+
+    def add_edge(self, parent, label, children):
+        self._graph.add_edge(parent, label, children)
+        return self._update([self._graph.node_ids.id(parent)])
+
+    def remove_edge(self, edge_id):
+        # like Graph.remove_edge, the last edge takes the id of the removed one
+        parent = self._graph.edge_parent(edge_id)
+        children = self._graph.edge_children(edge_id)
+        self._graph.remove_edge(edge_id)
+        self._drop_orphans(children)
+        return self._update([parent])
+
+    def replace_edge(self, edge_id, label, children):
+        # e.g. a leaf retargeted, the new edge gets the last id
+        parent = self._graph.edge_parent(edge_id)
+        old_children = self._graph.edge_children(edge_id)
+        self._graph.remove_edge(edge_id)
+        self._graph.add_edge(self._graph.node_ids.name(parent), label, children)
+        self._drop_orphans(old_children)
+        return self._update([parent])
+
+    def _drop_orphans(self, nodes):
+        # children of a removed edge left without edges and parents are no longer nodes
+        # of the graph and wait for nothing
+        for node in nodes:
+            if len(self._graph.out_edges(node)) == 0 and len(self._graph.in_edges(node)) == 0:
+                self._waiting.discard(node)
+
+    def _update(self, nodes, edited=True):
+        dirty = None if self._stale else self._relabel(nodes, set(nodes) if edited else set())
+        if dirty is not None and len(self._waiting) > 0:
+            self.accepted = False
+        elif dirty is None or not self._verify(dirty):
+            self.accepted = self._run_again()
+        else:
+            self.accepted = True
+
+        return self.accepted
+
+    def _run_again(self):
+        for _ in range(self._attempts):
+            if self._stats is not None:
+                self._stats.attempts += 1
+            try:
+                self.run = graph_run.label_run(self._automaton, self._graph, self._rng,
+                                               stats=self._stats)
+            except graph_run.RunFailed:
+                continue
+
+            self._waiting = set()
+            self._items = collections.Counter()
+            for node in range(len(self._graph.node_ids)):
+                self._count(self.run.encoded(node), 1)
+            self._connects = {}
+            self._jumps = {}
+            if self._verify(set()):
+                self._stale = False
+                return True
+
+        self._stale = True
+        return False
+
+    def _count(self, encoded, change):
+        if encoded is not None:
+            for item in graph_run.bits(encoded.vars):
+                self._items[('vars', item)] += change
+            for item in graph_run.bits(encoded.jumps):
+                self._items[('jumps', item)] += change
+
+    def _all_items(self, kind):
+        mask = 0
+        for (item_kind, item), count in self._items.items():
+            if item_kind == kind and count > 0:
+                mask |= item
+
+        return mask
+
+    def _choose(self, node, edge, symbols):
+        # transition for the node given the states of its children, the current one or
+        # one keeping the state of the node if possible
+        candidates = graph_run.candidate_transitions(self._graph, edge, self._automaton,
+                                                    self.run, symbols)
+        state = self.run.state_id(node)
+        same_state = [trans for trans in candidates
+                      if self._automaton.transition_state(trans) == state]
+        for trans in same_state:
+            if self._automaton.encoded_labelling(trans) is self.run.encoded(node):
+                return trans
+
+        return self._rng.choice(same_state or candidates) if len(candidates) > 0 else None
+
+    def _relabel(self, nodes, edited):
+        # relabels the nodes and the ancestors whose children changed state, returns the
+        # edited and relabelled nodes or None if some node has no transition or an edited
+        # one is on a cycle. Mapped nodes are on no cycle and a node is mapped only after
+        # all nodes below it, so a cycle an edit closes is found at the edited node.
+        symbols = graph_run.graph_symbols(self._automaton, self._graph)
+        dirty = set(nodes)
+        todo = collections.deque(nodes)
+        queued = set(nodes)
+        while len(todo) > 0:
+            node = todo.popleft()
+            queued.discard(node)
+            edges = self._graph.out_edges(node)
+            if len(edges) > 1:
+                return None  # nodes with several edges are never mapped by label_run
+
+            children = () if len(edges) == 0 else self._graph.edge_children(edges[0])
+            missing = len(edges) == 0 or any(self.run.state_id(child) == -1 for child in children)
+            if missing and (len(edges) > 0 or len(self._graph.in_edges(node)) > 0):
+                self._waiting.add(node)
+            else:
+                self._waiting.discard(node)
+            if missing:
+                if self.run.state_id(node) != -1:
+                    # unmapped up to the root, so that mapped nodes have only mapped nodes
+                    # below them and a node on a cycle is never mapped by a relabel
+                    self._count(self.run.encoded(node), -1)
+                    self.run.unmap_id(node)
+                    dirty.add(node)
+                    parents = set(self._graph.predecessors(node)) - queued
+                    todo += parents
+                    queued |= parents
+                continue
+
+            if node in edited and _on_cycle(self._graph, node):
+                return None  # label_run never maps a node on a cycle
+
+            trans = self._choose(node, edges[0], symbols)
+            if trans is None:
+                return None
+            if self._automaton.encoded_labelling(trans) is self.run.encoded(node):
+                continue
+
+            state = self.run.state_id(node)
+            if state != -1:
+                self._count(self.run.encoded(node), -1)
+                self.run.unmap_id(node)
+            graph_run.map_node_to_trans(self.run, node, self._automaton, trans)
+            self._count(self.run.encoded(node), 1)
+            dirty.add(node)
+            if self.run.state_id(node) != state:
+                parents = set(self._graph.predecessors(node)) - queued
+                todo += parents
+                queued |= parents
+
+        return dirty
+
+    def _verify(self, dirty):
+        try:
+            return self._verify_conditions(dirty)
+        except graph_run.Unreachable:
+            return False  # label_run maps no node the traversal misses either
+
+    def _verify_conditions(self, dirty):
+        graph = self._graph
+        run = self.run
+        if graph.edge_count() == 0 or len(graph.root_ids()) == 0:
+            return False  # no run is accepted from scratch either
+
+        cached = self._connects
+        self._connects = {}
+        sources = graph_run.connect_sources(graph, run, self._all_items('vars'))
+        for node, node_vars in sources.items():
+            for var in graph_run.bits(node_vars):
+                def search(visited):
+                    return graph_run.verify_condition_from_node(
+                        graph, node, run, var, graph_run.condition_in_node_connects, [], True,
+                        self._stats, visited), None
+
+                if not _search(cached, self._connects, (node, var), (), dirty, search).result:
+                    return False
+
+        cached = self._jumps
+        self._jumps = {}
+        paired = set()
+        all_jumps = self._all_items('jumps')
+        all_jumps |= run.label_bits.reverse_jumps(all_jumps)
+        for component in graph_run.traversal_components(graph):
+            pairs = []
+            processed_jumps = 0
+            for node in component:
+                if processed_jumps == all_jumps:
+                    break  # no node left in the component has a jump not processed
+                items = graph_run.node_jumps(run, node)
+                if not items & ~processed_jumps:
+                    continue
+                for jump in graph_run.bits(run.encoded(node).jumps):
+                    def search(visited):
+                        found = list(pairs)
+                        result = graph_run.verify_condition_from_node(
+                            graph, node, run, jump, graph_run.condition_in_node_jumps, found,
+                            False, self._stats, visited)
+                        return result, found[-1][1] if result else None
+
+                    searched = _search(cached, self._jumps, (node, jump), paired, dirty,
+                                       search)
+                    if not searched.result:
+                        return False
+                    pairs.append((node, searched.partner))
+                    paired.update(pairs[-1])
+                processed_jumps |= items
+
+            if not graph_run.jump_final_check(graph, run, pairs):
+                return False
+
+        return True
@@ -0,0 +1,136 @@
+import contextlib
+import hashlib
+import io
+import os
+import pickle
+import sys
+
+from graph_types import Graph, GraphAutomaton
+
+# Line formats, one edge or transition per line, '#' starts a comment:
+#   graph:      parent symbol child...
+#               node                           (node without an edge)
+#   automaton:  parent symbol child... | vars | forget | jumps
+# Names are separated by whitespace, sets of the automaton may be left empty. A jump is a
+# name ending in + or -, the two ends of a jump have the same name.
+
+
+def _records(lines):
+    for number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0].strip()
+        if line:
+            yield number, line
+
+
+def read_edges(lines):
+    for number, line in _records(lines):
+        fields = line.split()
+        if len(fields) == 1:
+            yield fields[0], None, None
+        else:
+            yield fields[0], fields[1], tuple(fields[2:])
+
+
+def read_transitions(lines):
+    for number, line in _records(lines):
+        parts = line.split('|')
+        head = parts[0].split()
+        if len(head) < 2 or len(parts) > 4:
+            raise RuntimeError("Malformed transition on line", number, line)
+
+        sets = [set(part.split()) for part in parts[1:]]
+        sets += [set()] * (3 - len(sets))
+        if any(len(jump) < 2 or jump[-1] not in '+-' for jump in sets[2]):
+            raise RuntimeError("Malformed transition on line", number, line)
+        yield (head[0], head[1], tuple(head[2:])) + tuple(sets)
+
+
+def load_graph(lines, graph=None):
+    graph = Graph() if graph is None else graph
+    for parent, symbol, children in read_edges(lines):
+        if symbol is None:
+            graph.add_node(parent)
+        else:
+            graph.add_edge(parent, symbol, children)
+
+    return graph
+
+
+def load_automaton(lines, automaton=None):
+    automaton = GraphAutomaton() if automaton is None else automaton
+    for transition in read_transitions(lines):
+        automaton.add_transition(*transition)
+
+    return automaton
+
+
+@contextlib.contextmanager
+def _open(path, mode='r'):
+    if path == '-':
+        yield sys.stdin if 'r' in mode else sys.stdout
+    else:
+        with open(path, mode) as stream:
+            yield stream
+
+
+def load_graph_file(path):
+    with _open(path) as lines:
+        return load_graph(lines)
+
+
+def load_automaton_file(path, cache_dir=None):
+    # With cache_dir the compiled automaton is kept there under the hash of the file
+    if cache_dir is None or path == '-':
+        with _open(path) as lines:
+            return load_automaton(lines)
+
+    with open(path, 'rb') as stream:
+        content = stream.read()
+    cached = os.path.join(cache_dir, automaton_digest(content) + '.automaton')
+    if os.path.exists(cached):
+        return load_compiled(cached)
+
+    automaton = load_automaton(io.StringIO(content.decode()))
+    save_compiled(automaton, cached)
+    return automaton
+
+
+def write_graph(graph, out):
+    has_edge = set()
+    for parent, symbol, children in graph.edges:
+        has_edge.add(parent)
+        out.write(' '.join((parent, symbol) + tuple(children)) + '\n')
+    for node in graph.nodes - has_edge:
+        out.write(node + '\n')
+
+
+def write_automaton(automaton, out):
+    for trans in automaton.transitions:
+        head = ' '.join((trans.parent, trans.symbol) + tuple(trans.children))
+        sets = [' '.join(sorted(names)) for names in (trans.vars, trans.forget, trans.jumps)]
+        out.write(' | '.join([head] + sets).rstrip() + '\n')
+
+
+_CACHE_FORMAT = b'graph-automaton-1\n'  # changes whenever the pickled classes change
+
+
+def automaton_digest(content):
+    # hex digest of the bytes of an automaton text, names its compiled automaton
+    return hashlib.sha256(_CACHE_FORMAT + content).hexdigest()
+
+
+def save_compiled(automaton, path):
+    # written aside and renamed, so processes sharing the cache never read a partial file
+    automaton.compile()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    partial = '%s.%d.tmp' % (path, os.getpid())
+    with open(partial, 'wb') as stream:
+        stream.write(pickle.dumps(automaton, pickle.HIGHEST_PROTOCOL))
+    os.replace(partial, path)
+
+
+def load_compiled(path):
+    with open(path, 'rb') as stream:
+        return pickle.loads(stream.read())
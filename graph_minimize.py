@@ -0,0 +1,134 @@
+import collections
+import itertools
+
+from graph_types import GraphAutomaton, Trans
+
+
+MinimizeReport = collections.namedtuple('MinimizeReport',
+                                        ['duplicates', 'non_productive', 'merged'])
+
+
+def _trans_key(trans):
+    return (trans.parent, trans.symbol, tuple(trans.children), frozenset(trans.vars),
+            frozenset(trans.forget), frozenset(trans.jumps))
+
+
+def _remove_duplicates(transitions):
+    seen = set()
+    unique = []
+    duplicates = []
+    for trans in transitions:
+        key = _trans_key(trans)
+        if key in seen:
+            duplicates.append(trans)
+        else:
+            seen.add(key)
+            unique.append(trans)
+
+    return unique, duplicates
+
+
+def _productive_states(transitions):
+    # states some run can label a node with, found bottom-up from the leaf transitions
+    productive = set()
+    changed = True
+    while changed:
+        changed = False
+        for trans in transitions:
+            if trans.parent not in productive and all(c in productive for c in trans.children):
+                productive.add(trans.parent)
+                changed = True
+
+    return productive
+
+
+def _refine(keys, transitions):
+    # coarsest partition where states of a class are produced by and used in the same
+    # transitions up to the classes of the other states
+    block = {state: 0 for state in keys}
+    while True:
+        signature = collections.defaultdict(set)
+        for trans in transitions:
+            key = _trans_key(trans)
+            label = (key[1],) + key[3:]
+            children = tuple(block[c] for c in trans.children)
+            signature[trans.parent].add(('produced', label, children))
+            for position, child in enumerate(trans.children):
+                signature[child].add(('used', label, block[trans.parent], position,
+                                      children[:position] + children[position + 1:]))
+
+        ids = {}
+        refined = {state: ids.setdefault((block[state], frozenset(signature[state])), len(ids))
+                   for state in keys}
+        if len(ids) == len(set(block.values())):
+            return refined
+        block = refined
+
+
+def _classes(block):
+    classes = collections.defaultdict(list)
+    for state, class_id in block.items():
+        classes[class_id].append(state)
+
+    return classes
+
+
+def _closed_classes(states, transitions):
+    # Merging is exact only if every choice of states from the classes of a transition
+    # is a transition too, classes breaking it are split into single states
+    keys = set(_trans_key(trans) for trans in transitions)
+    block = _refine(states, transitions)
+    while True:
+        classes = _classes(block)
+        broken = set()
+        for trans in transitions:
+            parents = classes[block[trans.parent]]
+            children = [classes[block[c]] for c in trans.children]
+            for states_choice in itertools.product(parents, *children):
+                choice = trans._replace(parent=states_choice[0], children=states_choice[1:])
+                if _trans_key(choice) not in keys:
+                    broken.update(block[s] for s in (trans.parent,) + tuple(trans.children))
+                    break
+
+        if not broken:
+            return classes
+
+        next_id = len(classes)
+        for state in states:
+            if block[state] in broken:
+                block[state] = next_id
+                next_id += 1
+
+
+def minimize(automaton):
+    # Returns an automaton accepting the same graphs with the same labellings up to
+    # names of merged states, and a report of what was removed
+    transitions, duplicates = _remove_duplicates(automaton.transitions)
+
+    productive = _productive_states(transitions)
+    non_productive = [trans for trans in transitions
+                      if any(c not in productive for c in trans.children)]
+    transitions = [trans for trans in transitions
+                   if all(c in productive for c in trans.children)]
+
+    states = list(dict.fromkeys(trans.parent for trans in transitions))
+    classes = _closed_classes(states, transitions)
+    representative = {}
+    merged = {}
+    for members in classes.values():
+        members = [state for state in states if state in members]
+        representative.update((state, members[0]) for state in members)
+        if len(members) > 1:
+            merged[members[0]] = members[1:]
+
+    result = GraphAutomaton()
+    seen = set()
+    for trans in transitions:
+        trans = Trans(representative[trans.parent], trans.symbol,
+                      tuple(representative[c] for c in trans.children), trans.vars,
+                      trans.forget, trans.jumps)
+        if _trans_key(trans) not in seen:
+            seen.add(_trans_key(trans))
+            result.add_create_transition(trans)
+
+    return result, MinimizeReport(duplicates, non_productive, merged)
@@ -0,0 +1,202 @@
+#! /usr/bin/python3
+
+try:
+    import numpy
+except ImportError:  # optional, runs are verified by graph_run without it
+    numpy = None
+
+import graph_run
+
+# Verification of runs over numpy arrays, with the results of the graph_run verifiers.
+# The graph is kept as CSR successor arrays and the labellings as boolean node x var and
+# node x jump matrices. Searches go frontier by frontier, a frontier being the positions
+# node * width + column of the matrices it reached, so the connect propagation takes
+# all vars at once. Which partner a jump gets depends on the order the graph_run search
+# looks at nodes in, so when more than one partner can be reached that search picks it.
+
+
+def available():
+    return numpy is not None
+
+
+def _successors(graph):
+    # successors of node n as in graph.successors(n) are indices[indptr[n]:indptr[n + 1]]
+    # copied, arrays of the graph exporting their buffer could not grow
+    parent, start, end, children, _ = (numpy.array(column) for column in graph.columns())
+    lengths = end - start
+    edges = numpy.repeat(numpy.arange(len(parent)), lengths)
+    firsts = numpy.cumsum(lengths) - lengths
+    positions = start[edges] + numpy.arange(len(edges)) - firsts[edges]
+    order = numpy.argsort(parent[edges], kind='stable')
+
+    indptr = numpy.zeros(len(graph.node_ids) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(parent[edges], minlength=len(graph.node_ids)), out=indptr[1:])
+    return indptr, children[positions][order]
+
+
+def _expand(indptr, indices, frontier, width):
+    # the positions of the successors of the positions of the frontier, in their columns
+    rows, columns = numpy.divmod(frontier, width)
+    counts = indptr[rows + 1] - indptr[rows]
+    firsts = numpy.cumsum(counts) - counts
+    entries = numpy.repeat(indptr[rows] - firsts, counts) + numpy.arange(counts.sum())
+    return numpy.unique(indices[entries] * width + numpy.repeat(columns, counts))
+
+
+def _search(indptr, indices, top, stop, goal, limit, stats=None):
+    # goal nodes graph_run.verify_condition_from_node looks at from top, not going on
+    # from the stop nodes, the search ends once limit of them are found
+    processed = numpy.zeros(len(indptr) - 1, dtype=bool)
+    processed[top] = True
+    frontier = _expand(indptr, indices, numpy.array([top]), 1)
+    found = []
+    while len(frontier) > 0:
+        found.extend(frontier[goal[frontier]][:limit - len(found)].tolist())
+        if len(found) == limit:
+            break
+        processed[frontier] = True
+        frontier = _expand(indptr, indices, frontier[~stop[frontier]], 1)
+        frontier = frontier[~processed[frontier]]
+
+    if stats is not None:
+        stats.visit(int(numpy.count_nonzero(processed)))
+    return found
+
+
+def _labellings(graph, run):
+    # row of each node into the distinct labellings, row 0 for nodes without one
+    rows = numpy.zeros(len(graph.node_ids), dtype=numpy.int64)
+    distinct = {}
+    labellings = [None]
+    for node in range(len(graph.node_ids)):
+        encoded = run.encoded(node)
+        if encoded is not None:
+            row = distinct.get(id(encoded))
+            if row is None:
+                row = distinct[id(encoded)] = len(labellings)
+                labellings.append(encoded)
+            rows[node] = row
+
+    return rows, labellings
+
+
+def _bit_matrix(masks, rows, width):
+    matrix = numpy.zeros((len(masks), width), dtype=bool)
+    for row, mask in enumerate(masks):
+        for bit in graph_run.bits(mask):
+            matrix[row, bit.bit_length() - 1] = True
+
+    return matrix[rows]
+
+
+def _visit(stats, reached, width):
+    if stats is not None:
+        stats.visit(len(numpy.unique(numpy.flatnonzero(reached) // width)))
+
+
+def verify_connects(graph, run, stats=None):
+    run = graph_run.rebase_run(graph, run)
+    rows, labellings = _labellings(graph, run)
+    all_vars = 0
+    width = 0
+    for encoded in labellings[1:]:
+        all_vars |= encoded.vars
+        width = max(width, encoded.vars.bit_length(), encoded.forget.bit_length())
+    sources = graph_run.connect_sources(graph, run, all_vars)
+    if len(sources) == 0:
+        return True
+
+    indptr, indices = _successors(graph)
+    node_vars = _bit_matrix([0] + [encoded.vars for encoded in labellings[1:]], rows, width)
+    forget = _bit_matrix([0] + [encoded.forget for encoded in labellings[1:]], rows, width)
+    inner = numpy.array(graph.columns()[4], dtype=bool)
+    source_vars = numpy.zeros_like(node_vars)
+    source_vars[list(sources)] = _bit_matrix(list(sources.values()), range(len(sources)), width)
+    failing = (node_vars & ~forget & inner[:, None]).ravel()
+
+    # all vars propagated down from their sources at once as in graph_run
+    reached = numpy.zeros(len(graph.node_ids) * width, dtype=bool)
+    unsure = numpy.zeros(width, dtype=bool)
+    frontier = _expand(indptr, indices, numpy.flatnonzero(source_vars), width)
+    while len(frontier) > 0:
+        frontier = frontier[~reached[frontier]]
+        reached[frontier] = True
+        frontier = frontier[~forget.ravel()[frontier]]  # cut branch
+        found = frontier[failing[frontier]]
+        if not source_vars.ravel()[found].all():
+            _visit(stats, reached, width)
+            return False  # we look only for leaves with the same var
+        unsure[found % width] = True
+        frontier = _expand(indptr, indices, frontier, width)
+
+    _visit(stats, reached, width)
+    for var in numpy.flatnonzero(unsure):
+        for top in numpy.flatnonzero(source_vars[:, var]):
+            if _search(indptr, indices, top, forget[:, var], failing[var::width], 1, stats):
+                return False
+
+    return True
+
+
+def _jump_searches(graph, run, labellings):
+    # (node, jump bit) of each search of graph_run._verify_jumps in its order, a list for
+    # each component
+    all_jumps = 0
+    for encoded in labellings[1:]:
+        all_jumps |= encoded.jumps
+    all_jumps |= run.label_bits.reverse_jumps(all_jumps)
+
+    components = []
+    for component in graph_run.traversal_components(graph):
+        searches = []
+        processed_jumps = 0
+        for node in component:
+            if processed_jumps == all_jumps:
+                break  # no node left in the component has a jump not processed
+            items = graph_run.node_jumps(run, node)
+            if items & ~processed_jumps:
+                searches += [(node, jump) for jump in graph_run.bits(run.encoded(node).jumps)]
+                processed_jumps |= items
+        components.append(searches)
+
+    return components
+
+
+def verify_jumps(graph, run, stats=None):
+    run = graph_run.rebase_run(graph, run)
+    rows, labellings = _labellings(graph, run)
+    components = _jump_searches(graph, run, labellings)
+    if all(len(searches) == 0 for searches in components):
+        return True
+
+    reverse_jumps = run.label_bits.reverse_jumps
+    width = max((encoded.jumps | reverse_jumps(encoded.jumps)).bit_length()
+                for encoded in labellings[1:])
+    jumps = _bit_matrix([0] + [encoded.jumps for encoded in labellings[1:]], rows, width)
+    indptr, indices = _successors(graph)
+    no_stop = numpy.zeros(len(graph.node_ids), dtype=bool)
+
+    paired = numpy.zeros(len(graph.node_ids), dtype=bool)
+    for searches in components:
+        pairs = []
+        for node, jump in searches:
+            partners = jumps[:, reverse_jumps(jump).bit_length() - 1] & ~paired
+            limit = min(2, int(numpy.count_nonzero(partners)))
+            found = [] if limit == 0 else _search(indptr, indices, node, no_stop, partners,
+                                                    limit, stats)
+            if len(found) == 0:
+                return False
+            if len(found) == 1:
+                pairs.append((node, found[0]))
+            else:
+                found = list(pairs)
+                graph_run.verify_condition_from_node(graph, node, run, jump,
+                                                      graph_run.condition_in_node_jumps,
+                                                      found, False, stats)
+                pairs.append(found[-1])
+            paired[list(pairs[-1])] = True
+
+        if not graph_run.jump_final_check(graph, run, pairs):
+            return False
+
+    return True
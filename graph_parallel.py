@@ -0,0 +1,249 @@
+#! /usr/bin/python3
+
+import collections
+import concurrent.futures
+import itertools
+import os
+import random
+import time
+
+import graph_run
+import graph_search
+
+_problem = None  # (automaton, graph, labelling constraints) of the pool worker
+_automaton = None  # automaton of the batch pool worker
+_cache = None  # states of sub-DAGs of the graphs the batch pool worker checked
+
+
+def _init_worker(automaton, graph, constraints):
+    global _problem
+    _problem = (automaton, graph, constraints)
+
+
+def _init_batch_worker(automaton, cache_size):
+    global _automaton, _cache
+    _automaton = automaton
+    _cache = graph_run.SubgraphCache(automaton, cache_size)
+
+
+def _run_attempts(seed, attempts, counted, deadline):
+    # the run or None, the attempts made and, if counted, the stats counters of them.
+    # deadline is of time.monotonic, attempts stop after it so that workers are freed.
+    automaton, graph, constraints = _problem
+    stats = graph_run.RunStats() if counted else None
+    rng = random.Random(seed)
+    run = None
+    for attempt in range(attempts):
+        if deadline is not None and time.monotonic() >= deadline:
+            attempts = attempt
+            break
+        try:
+            run = graph_run.automaton_run(automaton, graph, rng, constraints, stats)
+            attempts = attempt + 1
+            break
+        except graph_run.RunFailed:
+            continue
+
+    return run, attempts, None if stats is None else stats.as_dict()
+
+
+def parallel_run(automaton, graph, workers=None, attempts=None, timeout=None, seed=0,
+                 chunk=64, propagate=False, cache=None, stats=None):
+    # attempts are split into tasks of chunk attempts, task i uses its own seeded rng and
+    # the accepted run of the lowest task is returned, so the result depends only on seed.
+    # The result is a graph_search.SearchResult like that of graph_search.search_run.
+    start = time.monotonic()
+    if graph_run.shared_parent(graph):
+        return graph_search.SearchResult('rejected', None, 0, time.monotonic() - start)
+    constraints = None
+    if propagate:
+        constraints = graph_run.labelling_constraints(automaton, graph, cache)
+        if constraints is None:
+            return graph_search.SearchResult('rejected', None, 0, time.monotonic() - start)
+
+    automaton.compile()  # workers get the compiled automaton
+    workers = workers or os.cpu_count() or 1
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                  initargs=(automaton, graph, constraints))
+    running = {}
+    results = {}
+    submitted = 0
+    spent = 0
+    success = None
+
+    try:
+        while True:
+            while success is None and len(running) < 2 * workers \
+                    and (attempts is None or submitted * chunk < attempts):
+                size = chunk if attempts is None else min(chunk, attempts - submitted * chunk)
+                running[pool.submit(_run_attempts, graph_search.attempt_seed(seed, submitted),
+                                    size, stats is not None, deadline)] = submitted
+                submitted += 1
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if len(running) == 0 or remaining is not None and remaining <= 0:
+                # a run found is kept even if tasks before it did not finish in time
+                status = 'unknown' if success is None else 'accepted'
+                run = None if success is None else results[success]
+                return graph_search.SearchResult(status, run, spent, time.monotonic() - start)
+
+            done, _ = concurrent.futures.wait(running, remaining,
+                                              concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                results[task], task_attempts, counts = future.result()
+                spent += task_attempts
+                if counts is not None:
+                    _add_counts(stats, counts)
+                if results[task] is not None and (success is None or task < success):
+                    success = task
+
+            if success is not None:
+                # only tasks before the successful one can still change the result
+                for future, task in list(running.items()):
+                    if task > success:
+                        future.cancel()
+                        del running[future]
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _check_graph(automaton, graph, cache=None):
+    # a graph no run can label fails alone, the rest of a batch is still checked
+    if graph.edge_count() == 0:
+        return False, "No edges"
+    if any(graph.has_node(node) and len(graph.out_edges(node)) == 0
+           for node in range(len(graph.node_ids))):
+        return False, "Node without an edge"
+    table = graph_run.automaton_table(automaton, graph, cache)
+    if table is None:
+        return False, "No structural run"
+
+    try:
+        run = graph_run.table_run(automaton, graph, table)
+    except graph_run.Unreachable as error:
+        return False, error.args[0]
+    if run is None:
+        return False, "No run satisfies connects and jumps"
+
+    return True, run
+
+
+def _check_chunk(chunk):
+    return [(graph_id, *_check_graph(_automaton, graph, _cache)) for graph_id, graph in chunk]
+
+
+def batch_run(automaton, graphs, workers=None, chunk=16, cache_size=100000):
+    # yields (graph id, accepted, run or reason) in input order, graph ids are positions
+    # in graphs or keys if graphs is a dict, each worker keeps the states of the
+    # sub-DAGs it saw for the following graphs
+    workers = workers or os.cpu_count() or 1
+    items = iter(graphs.items() if isinstance(graphs, dict) else enumerate(graphs))
+    automaton.compile()
+
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_batch_worker,
+                                                initargs=(automaton, cache_size)) as pool:
+        running = collections.deque()
+        while True:
+            while len(running) < 2 * workers:
+                graph_chunk = list(itertools.islice(items, chunk))
+                if len(graph_chunk) == 0:
+                    break
+                running.append(pool.submit(_check_chunk, graph_chunk))
+
+            if len(running) == 0:
+                return
+            yield from running.popleft().result()
+
+
+def _component_run(automaton, cache, graph, mode, seed, propagate, attempts, timeout, restarts,
+                   stats, backend):
+    start = time.monotonic()
+    if mode in ['table', 'search']:
+        try:
+            if mode == 'table':
+                run = graph_run.automaton_table_run(automaton, graph, cache, stats, timeout)
+            else:
+                run = graph_run.automaton_search(automaton, graph, stats, timeout)
+        except graph_run.SearchTimeout:
+            return graph_search.SearchResult('unknown', None, 0, time.monotonic() - start)
+        return graph_search.SearchResult('accepted' if run is not None else 'rejected', run, 0,
+                                         time.monotonic() - start)
+
+    return graph_search.search_run(automaton, graph, seed, attempts, timeout, restarts,
+                                   propagate=propagate, cache=cache, stats=stats, backend=backend)
+
+
+def _check_component(graph, mode, seed, propagate, attempts, timeout, restarts, backend, counted):
+    # counters of the stats go back to the caller, hooks are not run in the workers
+    stats = graph_run.RunStats() if counted else None
+    result = _component_run(_automaton, _cache, graph, mode, seed, propagate, attempts, timeout,
+                            restarts, stats, backend)
+    return result, None if stats is None else stats.as_dict()
+
+
+def _add_counts(stats, counts):
+    stats.attempts += counts['attempts']
+    stats.candidates += counts['candidates']
+    stats.visited.update(counts['visited'])
+    stats.seconds.update(counts['seconds'])
+
+
+def _merge_runs(automaton, graph, runs):
+    run = graph_run.new_run(automaton, graph)
+    for component_run in runs:
+        for node_id, node in enumerate(component_run.nodes):
+            if component_run.encoded(node_id) is not None:
+                run.map_id(graph.node_ids.id(node), component_run.state_id(node_id),
+                           component_run.encoded(node_id))
+
+    return run
+
+
+def forest_run(automaton, graph, mode='table', workers=None, seed=0, propagate=False,
+               attempts=None, timeout=None, restarts='luby', stats=None, backend='python',
+               cache=None, cache_size=100000):
+    # Weakly connected components of the graph are checked apart, in a pool if there are
+    # several, and their runs merged into a run of the graph. mode is 'table', 'search' or
+    # 'random' (graph_search.search_run with attempts), timeout bounds each component, the
+    # result is a graph_search.SearchResult, 'unknown' if no component is rejected but some
+    # ran out of attempts or of timeout seconds. cache is used only in this process.
+    start = time.monotonic()
+    components = graph.components()
+    if len(components) == 1:
+        if cache is None:
+            cache = graph_run.SubgraphCache(automaton, cache_size)
+        return _component_run(automaton, cache, graph, mode, seed, propagate, attempts, timeout,
+                              restarts, stats, backend)
+
+    workers = min(workers or os.cpu_count() or 1, len(components))
+    automaton.compile()
+    pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_batch_worker,
+                                                  initargs=(automaton, cache_size))
+    status = 'accepted'
+    spent = 0
+    try:
+        running = [pool.submit(_check_component, component, mode,
+                               graph_search.attempt_seed(seed, task), propagate, attempts,
+                               timeout, restarts, backend, stats is not None)
+                   for task, component in enumerate(components)]
+        try:
+            for future in concurrent.futures.as_completed(running, timeout):
+                result, counts = future.result()
+                spent += result.attempts
+                if counts is not None:
+                    _add_counts(stats, counts)
+                if result.status == 'rejected':
+                    return graph_search.SearchResult('rejected', None, spent,
+                                                     time.monotonic() - start)
+                if result.status == 'unknown':
+                    status = 'unknown'  # a later component may still be rejected
+        except concurrent.futures.TimeoutError:
+            status = 'unknown'
+
+        run = _merge_runs(automaton, graph, [future.result()[0].run for future in running]) \
+            if status == 'accepted' else None
+        return graph_search.SearchResult(status, run, spent, time.monotonic() - start)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,7 +1,10 @@
 #! /usr/bin/python3
 
+import collections
+import contextlib
 from enum import Enum
 import random
+import time
 
 from graph_types import Run
 
@@ -99,6 +102,27 @@ def _verify_connects_lit(graph, run):
 # OBSOLETE END HERE
 
 
+class RunFailed(RuntimeError):  # an attempt found no run, another one may
+    pass
+
+
+class SearchTimeout(RuntimeError):  # a search ran out of time before it ended
+    pass
+
+
+class Unreachable(RuntimeError):  # the traversal from the roots misses some node
+    pass
+
+
+def _deadline(timeout):
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def _check_deadline(deadline):
+    if deadline is not None and time.monotonic() > deadline:
+        raise SearchTimeout("Search out of time")
+
+
 class ConditionResults(Enum):
     CONTINUE = 0
     SUCCESS = 1
@@ -106,28 +130,138 @@ class ConditionResults(Enum):
     NOTHING = 3
 
 
-def _map_node_to_trans(run, node, trans):
-    run.map(node, trans.parent, trans.vars, trans.forget, trans.jumps)
+# Counters of runs and their verification, quiet unless hooks are added. A hook is
+# called as hook(event, *args) for the events
+#   'attempt' (number)             a new run is labelled
+#   'phase_start' (name)           'label', 'table', 'connects' or 'jumps' starts
+#   'phase_end' (name, seconds)    and ends
+#   'match' (node, partner)        a jump of node found its reverse in partner
+#   'conflict' (run, nodes, kind, items)
+#                                  labellings of the nodes made the attempt fail, kind
+#                                  is 'connects' or 'jumps' with the var or jump bits
+#                                  of items, or 'label' if a node whose children are
+#                                  the nodes had no transition
+#   'run' (run)                    a run is accepted
+class RunStats:
+    def __init__(self, hooks=()):
+        self.attempts = 0
+        self.candidates = 0  # candidate transitions examined
+        self.visited = collections.Counter()  # phase -> nodes visited by the searches
+        self.seconds = collections.Counter()  # phase -> time spent
+        self.hooks = list(hooks)
+        self._phase = None
+
+    def wants(self):
+        return len(self.hooks) > 0
+
+    def emit(self, event, *args):
+        for hook in self.hooks:
+            hook(event, *args)
+
+    def visit(self, count):
+        self.visited[self._phase] += count
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        outer = self._phase
+        self._phase = name
+        self.emit('phase_start', name)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds[name] += elapsed
+            self._phase = outer
+            self.emit('phase_end', name, elapsed)
+
+    def as_dict(self):
+        return {'attempts': self.attempts, 'candidates': self.candidates,
+                'visited': dict(self.visited), 'seconds': dict(self.seconds)}
+
+
+def _phase(stats, name):
+    return contextlib.nullcontext() if stats is None else stats.phase(name)
+
+
+def map_node_to_trans(run, node, automaton, trans):
+    run.map_id(node, automaton.transition_state(trans), automaton.encoded_labelling(trans))
     return run
 
 
-def _get_candidate_trans(edge, transitions, run):
-    return [trans for trans in transitions if
-            edge.symbol == trans.symbol and
-            len(edge.children) == len(trans.children) and
-            tuple((run.get_state(child) if child in run else False
-                   for child in edge.children)) == trans.children]
+def new_run(automaton, graph):
+    return Run(graph.node_ids, automaton.state_ids, automaton.label_bits)
+
+
+def rebase_run(graph, run):
+    # verification works with graph node ids, runs mapped by other names are translated
+    if run.nodes is graph.node_ids:
+        return run
+
+    rebased = Run(graph.node_ids, run.states, run.label_bits)
+    for node in run:
+        node_id = graph.node_ids.get(node)
+        if node_id != -1:
+            old_id = run.nodes.id(node)
+            rebased.map_id(node_id, run.state_id(old_id), run.encoded(old_id))
+
+    return rebased
+
+
+def graph_symbols(automaton, graph):
+    # automaton symbol id of each graph symbol id, -1 for symbols the automaton lacks
+    return [automaton.symbol_ids.get(symbol) for symbol in graph.symbol_ids]
+
+
+def candidate_transitions(graph, edge, automaton, run, symbols):
+    children_states = tuple(run.state_id(child) for child in graph.edge_children(edge))
+    if -1 in children_states:
+        return []
+
+    return automaton.candidates(symbols[graph.edge_symbol(edge)], children_states)
+
+
+def _chose_transition(graph, edge, automaton, run, symbols, rng=random, propagation=None,
+                      stats=None, weights=None):
+    # weights, if given, maps encoded labellings of transitions to their weight, 1 if missing
+    candidate_trans = candidate_transitions(graph, edge, automaton, run, symbols)
+    if stats is not None:
+        stats.candidates += len(candidate_trans)
+    if propagation is not None:
+        candidate_trans = propagation.prune(graph.edge_parent(edge), candidate_trans)
+    if len(candidate_trans) == 0:
+        return None
+    if weights is None or len(candidate_trans) == 1:
+        return rng.choice(candidate_trans)
+
+    return rng.choices(candidate_trans, [weights.get(automaton.encoded_labelling(trans), 1.0)
+                                         for trans in candidate_trans])[0]
+
 
+def _conflict(stats, graph, run, source, node, items):
+    # the nodes from source to node whose labellings let the vars get from one to the other
+    if stats is not None and stats.wants():
+        stats.emit('conflict', run, graph.find_path(source, node) or [source, node], 'connects',
+                   items)
 
-def _chose_transition(edge, transitions, run):
-    candidate_trans = _get_candidate_trans(edge, transitions, run)
-    return random.choice(candidate_trans) if len(candidate_trans) > 0 else None
+
+def _search_candidates(graph, edge, automaton, run, symbols):
+    # drop transitions whose state no parent edge can take at the node position
+    node = graph.edge_parent(edge)
+    parent_slots = [(symbols[graph.edge_symbol(parent_edge)], len(children), position)
+                    for parent_edge in graph.in_edges(node)
+                    for children in [graph.edge_children(parent_edge)]
+                    for position, child in enumerate(children)
+                    if child == node]
+    return [trans for trans in candidate_transitions(graph, edge, automaton, run, symbols)
+            if all(automaton.allows_child(symbol, arity, position,
+                                          automaton.transition_state(trans))
+                   for symbol, arity, position in parent_slots)]
 
 
 def _get_successor(graph, node):
-    return [child for children_tuple in
-            [edge.children for edge in graph.edges if edge.parent == node]  # all children tuples
-            for child in children_tuple]
+    node_ids = graph.node_ids
+    return [node_ids.name(child) for child in graph.successors(node_ids.id(node))]
 
 
 def _get_reverse_jump(jump):
@@ -135,210 +269,733 @@ def _get_reverse_jump(jump):
     return jump[0:-1] + '-' if jump[-1] == '+' else jump[0:-1] + '+'
 
 
-def _condition_in_node_jumps(_, node, jump, run, explored_jump_pairs):
+def bits(mask):
+    while mask != 0:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit
+
+
+def condition_in_node_jumps(_, node, jump, run, explored_jump_pairs):
     assert len([pair for pair in explored_jump_pairs if node in pair]) <= 1
 
-    if _get_reverse_jump(jump) in run.at(node).jumps \
+    if run.label_bits.reverse_jumps(jump) & run.encoded(node).jumps \
             and len([pair for pair in explored_jump_pairs
                      if node in pair]) == 0:  # node found
-        print(jump, " has reverse ", run.at(node))
         return ConditionResults.SUCCESS
 
     return ConditionResults.NOTHING
 
 
-def _should_process_node_jumps(node, run, processed_jumps):
-    return len(run.at(node).jumps) > 0 \
-           and any([jump_node not in processed_jumps for jump_node in run.at(node).jumps])
+def node_jumps(run, node):
+    jumps = run.encoded(node).jumps
+    return jumps | run.label_bits.reverse_jumps(jumps)
 
 
-def _process_node_jumps(graph, run, node, processed_jumps, semantics_info):
-    for jump in run.at(node).jumps:
-        if not _verify_condition_from_node(graph, node, run, jump,
-                                           _condition_in_node_jumps, semantics_info, False):
+def _process_node_jumps(graph, run, node, semantics_info, stats=None):
+    for jump in bits(run.encoded(node).jumps):
+        if not verify_condition_from_node(graph, node, run, jump, condition_in_node_jumps,
+                                           semantics_info, False, stats):
+            if stats is not None and stats.wants():
+                stats.emit('conflict', run, [node], 'jumps', jump)
             return False
-        processed_jumps.update([jump, _get_reverse_jump(jump)])
 
     return True
 
 
-def _jump_final_check(graph, run, semantics_info):
+def _jump_nodes(run, nodes):
+    # nodes carrying each jump bit
+    jump_nodes = {}
+    for node in nodes:
+        for jump in bits(run.encoded(node).jumps):
+            jump_nodes.setdefault(jump, []).append(node)
+
+    return jump_nodes
+
+
+def jump_final_check(graph, run, semantics_info):
+    # a pair fails if any other pair has one of its jumps, the path between the nodes of
+    # a pair was compared only with itself and never changed the result
+    reverse_jumps = run.label_bits.reverse_jumps
+    node_pairs = {}
+    for pair in semantics_info:
+        for node in set(pair):
+            node_pairs.setdefault(node, []).append(pair)
+    jump_nodes = _jump_nodes(run, sorted(node_pairs))  # only nodes in pairs matter
+
     for jump_pair in semantics_info:
-        pair_path = _find_path(graph, jump_pair[0], jump_pair[1])
-        jumps = [jump for jump in run[jump_pair[0]].jumps
-                 if _get_reverse_jump(jump) in run[jump_pair[1]].jumps]
-        for jump in jumps:
-            similar_nodes = [node for node in graph.nodes if jump in run[node].jumps]
-            for similar_node in similar_nodes:
-                similar_pairs = [pair for pair in semantics_info if similar_node in pair]
-                for similar_pair in similar_pairs:
+        jumps = run.encoded(jump_pair[0]).jumps \
+            & reverse_jumps(run.encoded(jump_pair[1]).jumps)
+        for jump in bits(jumps):
+            for similar_node in jump_nodes.get(jump, []):
+                for similar_pair in node_pairs.get(similar_node, []):
                     if similar_pair == jump_pair:
                         continue
                     second_node = list(set(similar_pair) - {similar_node})[0]
-                    if _get_reverse_jump(jump) not in run[second_node].jumps:
-                        continue
-                    path_intersection = set(pair_path).intersection(
-                        set(_find_path(graph, jump_pair[0], jump_pair[1])))
-                    if len(path_intersection) > 0:
+                    if reverse_jumps(jump) & run.encoded(second_node).jumps:
                         return False
 
     return True
 
 
-def _verify_jumps(graph, run):
+def _verify_jumps(graph, run, stats=None):
     return _run_graph_traversal(graph,
-                                run,
-                                _should_process_node_jumps,
+                                rebase_run(graph, run),
+                                node_jumps,
                                 _process_node_jumps,
-                                _jump_final_check)
+                                jump_final_check,
+                                stats)
 
 
-def _condition_in_node_connects(graph, node, var, run, _):
-    if var in run.at(node).forget:  # cut branch
+def condition_in_node_connects(graph, node, var, run, _):
+    encoded = run.encoded(node)
+    if encoded.forget & var:  # cut branch
         return ConditionResults.CONTINUE
-    if var in run.at(node).vars \
-            and len([edge for edge in graph.edges
-                     if edge.parent == node and len(edge.children) > 0]) > 0:
+    if encoded.vars & var and not graph.is_leaf(node):
         # we found another node but we look only for leaves with the same var
         return ConditionResults.FAIL
 
     return ConditionResults.NOTHING
 
 
-def _should_process_node_connects(node, run, processed_vars):
-    return len(run.at(node).vars) > 0 \
-           and any([var not in processed_vars for var in run.at(node).vars])
+def connect_sources(graph, run, all_vars=None):
+    # nodes the traversal from the roots checks connects from, with all their vars, with
+    # all_vars, the vars of the whole run, a component is left once no new source can come
+    sources = {}
+    for component in traversal_components(graph):
+        processed_vars = 0
+        for node in component:
+            assert run.encoded(node) is not None
+            node_vars = run.encoded(node).vars
+            if node_vars & ~processed_vars:
+                sources[node] = node_vars
+                processed_vars |= node_vars
+            if processed_vars == all_vars:
+                break
 
+    return sources
 
-def _process_node_connects(graph, run, node, processed_vars, semantics_info):
-    for var in run.at(node).vars:
-        if not _verify_condition_from_node(graph, node, run, var,
-                                           _condition_in_node_connects, semantics_info, True):
-            return False
-        processed_vars.add(var)
 
-    return True
+def _verify_connects(graph, run, stats=None):
+    # All vars are propagated down from their sources at once, each node takes a var
+    # at most once. A var reaching a non-leaf node having it fails unless the node is
+    # a source of the var itself, then it may have come back to it through a cycle and
+    # the sources of that var are checked one by one.
+    run = rebase_run(graph, run)
+    sources = connect_sources(graph, run)
+    reached = [0] * len(graph.node_ids)
+    unsure = 0
+    todo = [(child, node_vars) for node, node_vars in sources.items()
+            for child in graph.successors(node)]
 
+    visited = 0
+    while len(todo) > 0:
+        node, node_vars = todo.pop()
+        node_vars &= ~reached[node]
+        if node_vars == 0:
+            continue
+        reached[node] |= node_vars
+        visited += 1
+
+        encoded = run.encoded(node)
+        assert encoded is not None
+        node_vars &= ~encoded.forget  # cut branch
+        if not graph.is_leaf(node) and node_vars & encoded.vars:
+            failed = node_vars & encoded.vars & ~sources.get(node, 0)
+            if failed:
+                if stats is not None:
+                    stats.visit(visited)
+                    source = next(source for source, source_vars in sources.items()
+                                  if source_vars & failed)
+                    _conflict(stats, graph, run, source, node, failed)
+                return False  # we look only for leaves with the same var
+            unsure |= node_vars & encoded.vars
+        if node_vars != 0:
+            todo += [(child, node_vars) for child in graph.successors(node)]
+
+    if stats is not None:
+        stats.visit(visited)
+    for var in bits(unsure):
+        for node in [node for node, node_vars in sources.items() if node_vars & var]:
+            if not verify_condition_from_node(graph, node, run, var,
+                                               condition_in_node_connects, [], True, stats):
+                return False
 
-def _verify_connects(graph, run):
-    return _run_graph_traversal(graph, run,
-                                _should_process_node_connects,
-                                _process_node_connects,
-                                lambda g, r, s: True)
+    return True
 
 
-def _verify_condition_from_node(graph, top_node, run, item, condition_checker,
-                                semantics_info, default_result):
-    todo = _get_successor(graph, top_node)
-    processed = {top_node}
+def verify_condition_from_node(graph, top_node, run, item, condition_checker,
+                                semantics_info, default_result, stats=None, visited=None):
+    # visited, if given, gets the nodes the search looked at, the result depends only
+    # on their labellings, successors and on which of them are in semantics_info
+    todo = graph.successors(top_node)
+    processed = {top_node} if visited is None else visited
+    processed.add(top_node)
+    result = None
 
-    while len(todo) > 0:
+    while len(todo) > 0 and result is None:
         for node in todo:
-            assert node in run
+            assert run.labelling(node) is not None
             res = condition_checker(graph, node, item, run, semantics_info)
             if res is ConditionResults.CONTINUE:
                 todo.remove(node)
                 processed.add(node)
                 continue
             elif res is ConditionResults.FAIL:
-                return False
+                processed.add(node)  # looked at, the result depends on it
+                _conflict(stats, graph, run, top_node, node, item)
+                result = False
+                break
             elif res is ConditionResults.SUCCESS:
+                processed.add(node)
                 semantics_info.append((top_node, node))
-                return True
+                if stats is not None:
+                    stats.emit('match', top_node, node)
+                result = True
+                break
 
             todo.remove(node)
             processed.add(node)
-            todo += [new_node for new_node in _get_successor(graph, node) if
+            todo += [new_node for new_node in graph.successors(node) if
                      new_node not in processed]
 
     assert top_node in processed
-    return default_result
+    if stats is not None:
+        stats.visit(len(processed))
+    return default_result if result is None else result
 
 
-def _find_path(graph, node1, node2):
-    todo = _get_successor(graph, node1)
-    prec = {succ: node1 for succ in todo}
-    found = False
+def _root_components(graph):
+    # roots of each weakly connected component, in the order of their first roots
+    roots = graph.root_ids()
+    if len(roots) == 0:
+        raise Unreachable("No root found ", graph.nodes)
+    if len(roots) == 1:
+        return [roots]
 
-    while len(todo) > 0 and not found:
-        for node in todo:
-            found = node == node2
-            if found:
-                break
-            todo.remove(node)
-            tmp = _get_successor(graph, node)
-            prec.update({succ: node for succ in tmp})
-            todo += [n for n in tmp if n not in todo]
+    component = list(range(len(graph.node_ids)))  # union-find parents
 
-    if node2 not in prec.keys():
-        return None
+    def find(node):
+        while component[node] != node:
+            component[node] = component[component[node]]
+            node = component[node]
+        return node
 
-    # reconstruct path
-    path = []
-    node = node2
-    while node is not node1:
-        path = [node] + path
-        node = prec[node]
+    for edge in range(graph.edge_count()):
+        for child in graph.edge_children(edge):
+            first, second = sorted((find(graph.edge_parent(edge)), find(child)))
+            component[second] = first
 
-    path = [node1] + path
+    components = {}
+    for root in roots:
+        components.setdefault(find(root), []).append(root)
 
-    return path
+    return list(components.values())
 
 
-def _run_graph_traversal(graph, run, should_process_node, process_node, final_check):
-    todo = list(graph.root())
-    processed_nodes = set()
-    processed_items = set()
-    semantics_info = []
+def _component_order(graph, roots, processed_nodes, finished):
+    todo = roots[::-1]
+    in_todo = collections.Counter(roots)
 
     while len(todo) > 0:
         node = todo.pop()
-        if should_process_node(node, run, processed_items):
-            assert node in run
-            if not process_node(graph, run, node, processed_items, semantics_info):
-                return False
+        in_todo[node] -= 1
+        yield node
 
         processed_nodes.add(node)
-        todo += [new_node for new_node in _get_successor(graph, node) if
-                 new_node not in processed_nodes and new_node not in todo]
+        new_nodes = [new_node for new_node in graph.successors(node) if
+                     new_node not in processed_nodes and in_todo[new_node] == 0]
+        todo += new_nodes
+        in_todo.update(new_nodes)
 
-    assert processed_nodes == graph.nodes
-    if not final_check(graph, run, semantics_info):
-        return False
+    finished.append(roots)
+
+
+def traversal_components(graph):
+    # Depth first from each root in turn, a node is visited once unless it was twice in
+    # the same successor list when it got to the stack. A generator of the nodes is
+    # given for each weakly connected component, the checks of runs start again in each
+    # as if it was a graph alone. Unreachable is raised when all were gone through and
+    # some node was not visited.
+    components = _root_components(graph)
+    processed_nodes = set()
+    finished = []
+    for roots in components:
+        yield _component_order(graph, roots, processed_nodes, finished)
+
+    if len(finished) == len(components) and processed_nodes != set(
+            node for node in range(len(graph.node_ids)) if graph.has_node(node)):
+        raise Unreachable("Nodes not reachable from a root")
+
+
+def traversal_order(graph):
+    for component in traversal_components(graph):
+        yield from component
+
+
+def _run_graph_traversal(graph, run, node_items, process_node, final_check, stats=None):
+    # node_items gives the mask of items (vars, jumps) a node is checked for, a node is
+    # processed if it has some item no processed node had
+    for component in traversal_components(graph):
+        processed_items = 0
+        semantics_info = []
+        for node in component:
+            assert run.encoded(node) is not None
+            items = node_items(run, node)
+            if items & ~processed_items:
+                if not process_node(graph, run, node, semantics_info, stats):
+                    return False
+                processed_items |= items
+
+        if not final_check(graph, run, semantics_info):
+            return False
 
     return True
 
 
-def automaton_run(automaton, graph):
-    # 1) Create already processed edges and not processed edges
-    run = Run()
-    processed = []
-    todo = list(graph.edges)
+def shared_parent(graph):
+    # a node with several edges can never be mapped
+    edge_count = graph.edge_count()
+    return len(set(graph.edge_parent(edge) for edge in range(edge_count))) != edge_count
+
+
+def label_run(automaton, graph, rng=random, constraints=None, stats=None, weights=None):
+    if shared_parent(graph):
+        raise RunFailed("Run failed, a node has several edges")
+
+    # 1) Count not mapped children of each edge, edges with none are ready
+    run = new_run(automaton, graph)
+    propagation = None if constraints is None else _Propagation(automaton, graph, constraints)
+    symbols = graph_symbols(automaton, graph)
+    waiting = [len(set(graph.edge_children(edge))) for edge in range(graph.edge_count())]
+    ready = collections.deque(i for i, count in enumerate(waiting) if count == 0)
+    mapped = 0
+
+    # 2) apply transitions to ready edges, mapping a node may make its parents ready
+    while len(ready) > 0:
+        edge = ready.popleft()
+        chosen_trans = _chose_transition(graph, edge, automaton, run, symbols, rng, propagation,
+                                         stats, weights)
+        if chosen_trans is None:
+            if stats is not None and stats.wants():
+                stats.emit('conflict', run, list(graph.edge_children(edge)), 'label', 0)
+            raise RunFailed("Run failed")
+        node = graph.edge_parent(edge)
+        run = map_node_to_trans(run, node, automaton, chosen_trans)
+        if propagation is not None:
+            propagation.labelled(node, chosen_trans)
+        mapped += 1
+
+        for edge_id in graph.in_edges(node):
+            waiting[edge_id] -= 1
+            if waiting[edge_id] == 0:
+                ready.append(edge_id)
+
+    if mapped != graph.edge_count():
+        raise RunFailed("Run failed")
 
-    # 2) search for applicable transitions
-    while len(todo) is not 0:
-        orig_todo_size = len(todo)
-        for edge in todo:
-            chosen_trans = _chose_transition(edge, automaton.transitions, run)
-            if chosen_trans is None:
-                continue
-            run = _map_node_to_trans(run, edge.parent, chosen_trans)
-            processed.append(edge)
-            todo.remove(edge)
+    return run
+
+
+def verifiers(backend):
+    # connect and jump verifiers of a backend, 'python' or 'numpy'
+    if backend == 'numpy':
+        import graph_numpy
+        if not graph_numpy.available():
+            raise ImportError("The numpy backend needs numpy")
+        return graph_numpy.verify_connects, graph_numpy.verify_jumps
+    if backend != 'python':
+        raise ValueError("Unknown backend", backend)
+
+    return _verify_connects, _verify_jumps
 
-        if orig_todo_size - len(todo) == 0 and len(todo) is not 0:
-            # print("Run: ", run)
-            raise RuntimeError("Run failed")
+
+def automaton_run(automaton, graph, rng=random, constraints=None, stats=None, backend='python',
+                  weights=None):
+    verify_connects, verify_jumps = verifiers(backend)
+    if stats is not None:
+        stats.attempts += 1
+        stats.emit('attempt', stats.attempts)
+    with _phase(stats, 'label'):
+        run = label_run(automaton, graph, rng, constraints, stats, weights)
 
     # 3) verify run conditions
     # 3.1. verify connecting conditions
-    if not _verify_connects(graph, run):
-        raise RuntimeError("Failed to verify connects")
+    with _phase(stats, 'connects'):
+        if not verify_connects(graph, run, stats):
+            raise RunFailed("Failed to verify connects")
     # 3.2. verify jumping
-    if not _verify_jumps(graph, run):
-        raise RuntimeError("Failed to verify jumps")
+    with _phase(stats, 'jumps'):
+        if not verify_jumps(graph, run, stats):
+            raise RunFailed("Failed to verify jumps")
 
     assert all([node in run for node in graph.nodes])
-    print("Final run:")
-    print(run)
+    if stats is not None:
+        stats.emit('run', run)
     return run
+
+
+def _bottom_up_order(graph):
+    edge_count = graph.edge_count()
+    if shared_parent(graph):
+        return None
+
+    waiting = [len(set(graph.edge_children(edge))) for edge in range(edge_count)]
+    order = [i for i, count in enumerate(waiting) if count == 0]
+    for edge in order:
+        for parent_edge in graph.in_edges(graph.edge_parent(edge)):
+            waiting[parent_edge] -= 1
+            if waiting[parent_edge] == 0:
+                order.append(parent_edge)
+
+    return order if len(order) == edge_count else None
+
+
+def _search_frontiers(graph, order):
+    # nodes mapped before each position whose state is still needed from it on
+    last_use = {}
+    for position, edge in enumerate(order):
+        for child in graph.edge_children(edge):
+            last_use[child] = position
+
+    frontiers = []
+    frontier = []
+    for position, edge in enumerate(order):
+        frontier = [node for node in frontier if last_use[node] >= position]
+        frontiers.append(tuple(frontier))
+        if graph.edge_parent(edge) in last_use:
+            frontier.append(graph.edge_parent(edge))
+
+    return frontiers
+
+
+def automaton_search(automaton, graph, stats=None, timeout=None):
+    # stats counts a complete labelling as an attempt, SearchTimeout is raised after
+    # timeout seconds
+    deadline = _deadline(timeout)
+    order = _bottom_up_order(graph)
+    if order is None:
+        return None
+
+    frontiers = _search_frontiers(graph, order)
+    symbols = graph_symbols(automaton, graph)
+    run = new_run(automaton, graph)
+    failed = set()  # (position, frontier states) from which no labelling exists
+    labelled = 0  # number of complete labellings reached so far
+    stack = []  # [memo key, remaining candidates, labelled when entered]
+
+    while True:
+        _check_deadline(deadline)
+        position = len(stack)
+        if position == len(order):
+            if _verify_run(graph, run, stats):
+                return run
+            labelled += 1
+        else:
+            key = (position, tuple(run.state_id(node) for node in frontiers[position]))
+            if key not in failed:
+                candidates = _search_candidates(graph, order[position], automaton, run, symbols)
+                if stats is not None:
+                    stats.candidates += len(candidates)
+                stack.append([key, iter(candidates), labelled])
+
+        # move the deepest position to its next candidate, backtracking when exhausted
+        while len(stack) > 0:
+            key, candidates, labelled_before = stack[-1]
+            node = graph.edge_parent(order[len(stack) - 1])
+            if run.labelling(node) is not None:
+                run.unmap_id(node)
+            trans = next(candidates, None)
+            if trans is not None:
+                map_node_to_trans(run, node, automaton, trans)
+                break
+            stack.pop()
+            if labelled_before == labelled:
+                failed.add(key)
+        else:
+            return None
+
+
+# States of sub-DAGs of graphs for one automaton, shared by the tables of many graphs.
+# A sub-DAG is hash-consed to an id by its symbol and the ids of its children, it has
+# the states of any other with the same id. The least recently used are dropped
+# beyond size, a sub-DAG seen again after that gets a new id.
+class SubgraphCache:
+    def __init__(self, automaton, size=100000):
+        self._automaton = automaton
+        self._size = size
+        self._transitions = automaton.transition_count
+        self._entries = collections.OrderedDict()  # (symbol, children ids) -> (id, states)
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def automaton(self):
+        return self._automaton
+
+    def get(self, key):
+        if self._transitions != self._automaton.transition_count:
+            self._transitions = self._automaton.transition_count  # states changed
+            self._entries.clear()
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+        return entry
+
+    def put(self, key, states):
+        entry = (self._next_id, states)
+        self._next_id += 1
+        self._entries[key] = entry
+        if len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+        return entry
+
+
+def _edge_states(automaton, graph, edge, symbols, table):
+    children = graph.edge_children(edge)
+    states = {}
+    for trans in automaton.symbol_transitions(symbols[graph.edge_symbol(edge)], len(children)):
+        if all(state in table[child]
+               for child, state in zip(children, automaton.transition_children(trans))):
+            states.setdefault(automaton.transition_state(trans), []).append(trans)
+
+    return states
+
+
+def automaton_table(automaton, graph, cache=None):
+    # all states each node can get bottom-up, with the transitions giving them, nodes
+    # with the same sub-DAG as one in the cache share its states
+    order = _bottom_up_order(graph)
+    if order is None:
+        return None
+
+    if cache is not None and cache.automaton is not automaton:
+        raise RuntimeError("Cache of another automaton")
+
+    symbols = graph_symbols(automaton, graph)
+    table = {}
+    subgraph_ids = {}
+    for edge in order:
+        if cache is None:
+            states = _edge_states(automaton, graph, edge, symbols, table)
+        else:
+            key = (symbols[graph.edge_symbol(edge)],
+                   tuple(subgraph_ids[child] for child in graph.edge_children(edge)))
+            entry = cache.get(key)
+            if entry is None:
+                entry = cache.put(key, _edge_states(automaton, graph, edge, symbols, table))
+            subgraph_ids[graph.edge_parent(edge)], states = entry
+        if len(states) == 0:
+            return None
+        table[graph.edge_parent(edge)] = states
+
+    return table
+
+
+def labelling_constraints(automaton, graph, cache=None):
+    # Masks of the vars and jumps the nodes before each node in the root traversal can
+    # carry in any run. A node having a var (jump) outside of them is surely checked
+    # for connects (jumps) from. None if there is no run at all.
+    table = automaton_table(automaton, graph, cache)
+    if table is None:
+        return None
+
+    reverse_jumps = automaton.label_bits.reverse_jumps
+    vars_before = [0] * len(graph.node_ids)
+    jumps_before = [0] * len(graph.node_ids)
+    visited = set()
+    for component in traversal_components(graph):
+        possible_vars = 0
+        possible_jumps = 0
+        for node in component:
+            if node in visited:
+                continue
+            visited.add(node)
+            vars_before[node] = possible_vars
+            jumps_before[node] = possible_jumps
+            for trans in (trans for state_trans in table[node].values()
+                          for trans in state_trans):
+                encoded = automaton.encoded_labelling(trans)
+                possible_vars |= encoded.vars
+                possible_jumps |= encoded.jumps | reverse_jumps(encoded.jumps)
+
+    return vars_before, jumps_before
+
+
+class _Propagation:
+    # Connect and jump checks done while labelling bottom-up, for the nodes surely
+    # checked from.
+    def __init__(self, automaton, graph, constraints):
+        self._automaton = automaton
+        self._graph = graph
+        self._vars_before, self._jumps_before = constraints
+        self._failing = [0] * len(graph.node_ids)  # vars failing connects from the node down
+        self._jumps = [0] * len(graph.node_ids)  # jumps of the node and nodes below it
+
+    def _below(self, node):
+        failing = 0
+        jumps = 0
+        for child in self._graph.successors(node):
+            failing |= self._failing[child]
+            jumps |= self._jumps[child]
+
+        return failing, jumps
+
+    def prune(self, node, candidates):
+        failing, jumps = self._below(node)
+        reversed_below = self._automaton.label_bits.reverse_jumps(jumps)
+        kept = []
+        for trans in candidates:
+            encoded = self._automaton.encoded_labelling(trans)
+            if encoded.vars & ~self._vars_before[node] and encoded.vars & failing:
+                continue  # a var gets to a non-leaf node with it
+            if encoded.jumps & ~self._jumps_before[node] and encoded.jumps & ~reversed_below:
+                continue  # a jump has no reverse below
+            kept.append(trans)
+
+        return kept
+
+    def labelled(self, node, trans):
+        failing, jumps = self._below(node)
+        encoded = self._automaton.encoded_labelling(trans)
+        own_vars = 0 if self._graph.is_leaf(node) else encoded.vars
+        self._failing[node] = (own_vars | failing) & ~encoded.forget
+        self._jumps[node] = encoded.jumps | jumps
+
+
+def _require_children(required, children, children_states):
+    assigned = []
+    for child, state in zip(children, children_states):
+        if child not in required:
+            required[child] = state
+            assigned.append(child)
+        elif required[child] != state:  # shared child already needs another state
+            for node in assigned:
+                del required[node]
+            return None
+
+    return assigned
+
+
+def _distinct(automaton, transitions):
+    # identical transitions would give the same run again
+    seen = set()
+    for trans in transitions:
+        encoded = automaton.encoded_labelling(trans)
+        key = (automaton.transition_state(trans), automaton.transition_children(trans),
+               encoded.vars, encoded.forget, encoded.jumps)
+        if key not in seen:
+            seen.add(key)
+            yield trans
+
+
+def _extract_runs(automaton, graph, table):
+    # top-down, every node takes the state its parents require from it
+    order = _bottom_up_order(graph)[::-1]
+    required = {}
+    run = new_run(automaton, graph)
+    stack = []  # [remaining candidates, children states required by the current one]
+
+    while True:
+        position = len(stack)
+        if position == len(order):
+            yield run
+        else:
+            node = graph.edge_parent(order[position])
+            states = [required[node]] if node in required else list(table[node])
+            stack.append([_distinct(automaton, [trans for state in states
+                                                for trans in table[node][state]]), []])
+
+        while len(stack) > 0:
+            candidates, assigned = stack[-1]
+            edge = order[len(stack) - 1]
+            node = graph.edge_parent(edge)
+            for child in assigned:
+                del required[child]
+            if run.labelling(node) is not None:
+                run.unmap_id(node)
+
+            assigned = None
+            for trans in candidates:
+                assigned = _require_children(required, graph.edge_children(edge),
+                                             automaton.transition_children(trans))
+                if assigned is not None:
+                    map_node_to_trans(run, node, automaton, trans)
+                    break
+            if assigned is not None:
+                stack[-1][1] = assigned
+                break
+            stack.pop()
+        else:
+            return
+
+
+def _verify_run(graph, run, stats=None):
+    # a complete labelling checked as an attempt of stats
+    if stats is not None:
+        stats.attempts += 1
+        stats.emit('attempt', stats.attempts)
+    with _phase(stats, 'connects'):
+        if not _verify_connects(graph, run, stats):
+            return False
+    with _phase(stats, 'jumps'):
+        return _verify_jumps(graph, run, stats)
+
+
+def table_run(automaton, graph, table, stats=None, timeout=None):
+    # SearchTimeout is raised after timeout seconds
+    deadline = _deadline(timeout)
+    for run in _extract_runs(automaton, graph, table):
+        _check_deadline(deadline)
+        if _verify_run(graph, run, stats):
+            return run
+
+    return None
+
+
+def automaton_table_run(automaton, graph, cache=None, stats=None, timeout=None):
+    deadline = _deadline(timeout)
+    with _phase(stats, 'table'):
+        table = automaton_table(automaton, graph, cache)
+    if table is None:
+        return None
+
+    return table_run(automaton, graph, table, stats,
+                     None if deadline is None else deadline - time.monotonic())
+
+
+def _accepting_runs(automaton, graph, limit, timeout, cache=None):
+    # the accepted runs among those _extract_runs gives, the same run object changed
+    table = automaton_table(automaton, graph, cache)
+    if table is None or limit == 0:
+        return
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    found = 0
+    for run in _extract_runs(automaton, graph, table):
+        if deadline is not None and time.monotonic() > deadline:
+            return
+        if _verify_connects(graph, run) and _verify_jumps(graph, run):
+            yield run
+            found += 1
+            if found == limit:
+                return
+
+
+def accepting_runs(automaton, graph, limit=None, timeout=None, cache=None):
+    # All distinct accepted runs in a fixed order, found by one top-down walk over the
+    # state table that changes a single run, until limit runs or timeout seconds
+    for run in _accepting_runs(automaton, graph, limit, timeout, cache):
+        yield run.copy()
+
+
+def count_accepting_runs(automaton, graph, limit=None, timeout=None, cache=None):
+    # 2 with limit=2 tells an automaton is ambiguous on the graph
+    return sum(1 for _ in _accepting_runs(automaton, graph, limit, timeout, cache))
@@ -0,0 +1,125 @@
+#! /usr/bin/python3
+
+import collections
+import itertools
+import random
+import time
+
+import graph_run
+
+SearchResult = collections.namedtuple('SearchResult', ['status', 'run', 'attempts', 'seconds'])
+# status is 'accepted' with the run, 'rejected' when no run exists (known only with
+# propagate) or 'unknown' when the attempts or seconds ran out
+
+
+def luby(i):
+    # i-th term (from 1) of 1 1 2 1 1 2 4 1 1 2 1 1 2 4 8 ...
+    while True:
+        k = i.bit_length()
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+def restart_lengths(restarts='luby', unit=32, factor=2.0):
+    # attempts between restarts, unit times the Luby sequence or growing by factor
+    for i in itertools.count(1):
+        if restarts == 'luby':
+            yield unit * luby(i)
+        elif restarts == 'geometric':
+            yield max(1, round(unit * factor ** (i - 1)))
+        else:
+            raise ValueError("Unknown restarts", restarts)
+
+
+def attempt_seed(seed, attempt):
+    # attempt can be repeated alone with random.Random(attempt_seed(seed, attempt)) and
+    # the weights learned before it
+    return seed * 2 ** 32 + attempt
+
+
+def _avoids(encoded, kind, items, inner):
+    # a labelling of a node inside the path of a connects conflict cutting its vars, or
+    # one at an end of the path not having the items
+    if kind == 'jumps':
+        return encoded.jumps & items == 0
+    if inner:
+        return encoded.forget & items != 0
+    return encoded.vars & items == 0 or encoded.forget & items != 0
+
+
+class _Learning:
+    # Weights of transitions by their encoded labellings. A conflict lowers by decay, down
+    # to floor, the weights of the transitions labelling its nodes for which the node had
+    # another candidate avoiding the conflict, all of them if it was a node without one.
+    def __init__(self, automaton, graph, decay, floor):
+        self.weights = {}
+        self._automaton = automaton
+        self._graph = graph
+        self._symbols = graph_run.graph_symbols(automaton, graph)
+        self._decay = decay
+        self._floor = floor
+
+    def _alternatives(self, run, node):
+        edges = self._graph.out_edges(node)
+        return [self._automaton.encoded_labelling(trans) for edge in edges[:1]
+                for trans in graph_run.candidate_transitions(self._graph, edge, self._automaton,
+                                                            run, self._symbols)]
+
+    def _blame(self, encoded):
+        self.weights[encoded] = max(self._floor, self.weights.get(encoded, 1.0) * self._decay)
+
+    def __call__(self, event, *args):
+        if event != 'conflict':
+            return
+        run, nodes, kind, items = args
+        for position, node in enumerate(nodes):
+            encoded = run.encoded(node)
+            if encoded is None:
+                continue
+            if kind == 'label':
+                self._blame(encoded)
+                continue
+            inner = 0 < position < len(nodes) - 1
+            if not _avoids(encoded, kind, items, inner) \
+                    and any(_avoids(other, kind, items, inner)
+                            for other in self._alternatives(run, node)):
+                self._blame(encoded)
+
+
+def search_run(automaton, graph, seed=0, attempts=None, timeout=None, restarts='luby', unit=32,
+               factor=2.0, decay=0.5, floor=0.01, propagate=False, cache=None, stats=None,
+               backend='python'):
+    # Random runs until one is accepted or attempts or timeout seconds run out. Attempt i
+    # uses its own rng seeded by attempt_seed(seed, i) and weights its choices by what
+    # the conflicts of earlier attempts taught, restarts forget it. decay=1 does not learn.
+    start = time.monotonic()
+    if graph_run.shared_parent(graph):
+        return SearchResult('rejected', None, 0, time.monotonic() - start)
+    constraints = None
+    if propagate:
+        constraints = graph_run.labelling_constraints(automaton, graph, cache)
+        if constraints is None:
+            return SearchResult('rejected', None, 0, time.monotonic() - start)
+
+    stats = graph_run.RunStats() if stats is None else stats
+    learning = _Learning(automaton, graph, decay, floor)
+    stats.hooks.append(learning)
+    try:
+        attempt = 0
+        for length in restart_lengths(restarts, unit, factor):
+            learning.weights = {}
+            for _ in range(length):
+                if attempts is not None and attempt >= attempts \
+                        or timeout is not None and time.monotonic() - start >= timeout:
+                    return SearchResult('unknown', None, attempt, time.monotonic() - start)
+                rng = random.Random(attempt_seed(seed, attempt))
+                attempt += 1
+                try:
+                    run = graph_run.automaton_run(automaton, graph, rng, constraints, stats,
+                                                  backend, learning.weights or None)
+                except graph_run.RunFailed:
+                    continue
+                return SearchResult('accepted', run, attempt, time.monotonic() - start)
+    finally:
+        stats.hooks.remove(learning)
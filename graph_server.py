@@ -0,0 +1,238 @@
+#! /usr/bin/python3
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import io
+import json
+import os
+import sys
+import time
+
+import graph_io
+import graph_run
+import graph_search
+
+# Protocol, one JSON object per line each way over a Unix socket or TCP:
+#   request:   {"id": any, "automaton": text | "digest": hex, "graph": text,
+#               "mode": "random" | "table" | "search", "attempts": n, "seed": n,
+#               "timeout": seconds}
+#   response:  {"id": any, "status": "accepted" | "rejected" | "unknown" | "timeout" | "error",
+#               "digest": hex, "run": {node: {"state", "vars", "forget", "jumps"}}, "error": text}
+# Texts are in the line formats of graph_io. The digest of an automaton sent once may be
+# used instead of its text while the server keeps it. Requests of a connection may be
+# sent without waiting for responses, the responses come in the order of the requests.
+# "unknown" is a random search out of attempts or time, it does not tell that no run
+# exists.
+
+_automata = None  # digest -> (automaton, SubgraphCache) of the pool worker, oldest first
+_automata_size = 0
+
+
+def _init_worker(size):
+    global _automata, _automata_size
+    _automata = collections.OrderedDict()
+    _automata_size = size
+
+
+def _worker_automaton(digest, text):
+    # compiled automata are kept in each worker, a text is parsed once per worker
+    entry = _automata.get(digest)
+    if entry is None:
+        automaton = graph_io.load_automaton(io.StringIO(text))
+        automaton.compile()
+        entry = (automaton, graph_run.SubgraphCache(automaton))
+        _automata[digest] = entry
+        if len(_automata) > _automata_size:
+            _automata.popitem(last=False)
+    else:
+        _automata.move_to_end(digest)
+
+    return entry
+
+
+def _labelling_json(labelling):
+    return {'state': labelling.state, 'vars': sorted(labelling.vars),
+            'forget': sorted(labelling.forget), 'jumps': sorted(labelling.jumps)}
+
+
+def _check(digest, text, graph_text, mode, attempts, seed, deadline):
+    # deadline is of time.monotonic, the time a request waited in the pool counts
+    automaton, cache = _worker_automaton(digest, text)
+    graph = graph_io.load_graph(io.StringIO(graph_text))
+    timeout = None if deadline is None else max(0, deadline - time.monotonic())
+    if mode == 'random':
+        # propagation tells when no run exists at all
+        result = graph_search.search_run(automaton, graph, seed, attempts, timeout,
+                                         propagate=True, cache=cache)
+        if result.status != 'accepted':
+            return result.status, None
+        run = result.run
+    else:
+        try:
+            if mode == 'table':
+                run = graph_run.automaton_table_run(automaton, graph, cache, timeout=timeout)
+            else:
+                run = graph_run.automaton_search(automaton, graph, timeout=timeout)
+        except graph_run.SearchTimeout:
+            return 'timeout', None  # the worker is free for the next request
+
+    if run is None:
+        return 'rejected', None
+
+    return 'accepted', {node: _labelling_json(run.at(node)) for node in run}
+
+
+class CheckServer:
+    def __init__(self, workers=None, automata=64, attempts=1000, timeout=None):
+        self._workers = workers or os.cpu_count() or 1
+        self._attempts = attempts
+        self._timeout = timeout
+        self._pool = None
+        self._texts = collections.OrderedDict()  # digest -> automaton text, oldest first
+        self._texts_size = automata
+
+    async def __aenter__(self):
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            self._workers, initializer=_init_worker, initargs=(self._texts_size,))
+        return self
+
+    async def __aexit__(self, *exc):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _fields(self, request):
+        # mode, attempts, seed and timeout of a request, errors on missing or mistyped fields
+        def field(name, types, default):
+            value = request.get(name, default)
+            if not isinstance(value, types) or isinstance(value, bool):
+                raise RuntimeError("Invalid request field", name)
+            return value
+
+        if not isinstance(request.get('graph'), str) \
+                or not isinstance(request.get('automaton', request.get('digest')), str):
+            raise RuntimeError("A request needs graph and automaton or digest texts")
+        mode = field('mode', str, 'random')
+        if mode not in ['random', 'table', 'search']:
+            raise RuntimeError("Unknown mode", mode)
+        attempts = field('attempts', int, self._attempts)
+        if attempts < 0:
+            raise RuntimeError("Invalid request field", 'attempts')
+        timeout = field('timeout', (int, float, type(None)), self._timeout)
+        return mode, attempts, field('seed', int, 0), timeout
+
+    def _automaton_text(self, request):
+        if 'automaton' in request:
+            text = request['automaton']
+            digest = graph_io.automaton_digest(text.encode())
+            self._texts[digest] = text
+            if len(self._texts) > self._texts_size:
+                self._texts.popitem(last=False)
+        else:
+            digest = request['digest']
+            text = self._texts.get(digest)
+            if text is None:
+                raise RuntimeError("Unknown automaton digest", digest)
+        self._texts.move_to_end(digest)
+
+        return digest, text
+
+    async def check(self, request):
+        response = {'id': request.get('id')}
+        try:
+            mode, attempts, seed, timeout = self._fields(request)
+            digest, text = self._automaton_text(request)
+            response['digest'] = digest
+            deadline = None if timeout is None else time.monotonic() + timeout
+            future = asyncio.get_running_loop().run_in_executor(
+                self._pool, _check, digest, text, request['graph'], mode, attempts, seed,
+                deadline)
+            # runs stop by the deadline in the pool, the wait covers loading the request
+            response['status'], response['run'] = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            response.update(status='timeout', run=None)
+        except Exception as error:  # any failure answers its request, later ones still go
+            words = list(map(str, error.args))
+            if not isinstance(error, RuntimeError):
+                words.insert(0, type(error).__name__)
+            response.update(status='error', run=None, error=' '.join(words))
+
+        return response
+
+    async def handle(self, reader, writer):
+        responses = asyncio.Queue()
+
+        async def send():
+            while True:
+                response = await responses.get()
+                if response is None:
+                    break
+                writer.write(json.dumps(await response).encode() + b'\n')
+                await writer.drain()
+
+        sender = asyncio.create_task(send())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                if isinstance(request, dict):
+                    response = asyncio.create_task(self.check(request))
+                else:
+                    response = asyncio.get_running_loop().create_future()
+                    response.set_result({'id': None, 'status': 'error', 'run': None,
+                                         'error': "Malformed request"})
+                await responses.put(response)
+            await responses.put(None)
+            await sender
+        finally:
+            sender.cancel()
+            writer.close()
+
+
+async def serve(path=None, host='127.0.0.1', port=0, workers=None, automata=64, attempts=1000,
+                timeout=None, ready=None):
+    # serves until cancelled, ready is called with the listening server
+    limit = 2 ** 28  # a request is a line, graphs may be long
+    async with CheckServer(workers, automata, attempts, timeout) as checker:
+        if path is not None:
+            server = await asyncio.start_unix_server(checker.handle, path, limit=limit)
+        else:
+            server = await asyncio.start_server(checker.handle, host, port, limit=limit)
+        async with server:
+            if ready is not None:
+                ready(server)
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check graphs against automata sent over "
+                                     "a local socket, one JSON request per line.")
+    parser.add_argument('--unix', metavar='PATH', help="Unix socket instead of TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--automata', type=int, default=64, help="compiled automata kept")
+    parser.add_argument('--attempts', type=int, default=1000, help="default random attempts")
+    parser.add_argument('--timeout', type=float, help="default seconds per request")
+    args = parser.parse_args(argv)
+
+    def ready(server):
+        print("Listening on", ', '.join(str(s.getsockname()) for s in server.sockets),
+              file=sys.stderr, flush=True)
+
+    try:
+        asyncio.run(serve(args.unix, args.host, args.port, args.workers, args.automata,
+                          args.attempts, args.timeout, ready))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
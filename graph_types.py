@@ -3,109 +3,660 @@
 """
 Basic definitions of data types for graph automata
 """
+from array import array
 import collections
 
 Edge = collections.namedtuple('Edge', ['parent', 'symbol', 'children'])
 Trans = collections.namedtuple(
-    'Transition', ['parent', 'symbol', 'children', 'vars', 'forget', 'jumps'])
+    'Trans', ['parent', 'symbol', 'children', 'vars', 'forget', 'jumps'])
 Labelling = collections.namedtuple('Labelling', ['state', 'vars', 'forget', 'jumps'])
 
 
+class Interner:  # dense integer ids of names, in the order the names are first seen
+    __slots__ = ('_ids', '_names')
+
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __iter__(self):
+        return self._names.__iter__()
+
+    def intern(self, name):
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._ids[name] = name_id
+            self._names.append(name)
+
+        return name_id
+
+    def id(self, name):
+        return self._ids[name]
+
+    def get(self, name, default=-1):
+        return self._ids.get(name, default)
+
+    def name(self, name_id):
+        return self._names[name_id]
+
+
+class EncodedLabelling:  # labelling with vars, forget and jumps as bit masks
+    __slots__ = ('labelling', 'vars', 'forget', 'jumps')
+
+    def __init__(self, labelling, variables, forget, jumps):
+        self.labelling = labelling
+        self.vars = variables
+        self.forget = forget
+        self.jumps = jumps
+
+
+# Bit of each variable and jump of an automaton, jumps j+ and j- get the neighbouring
+# bits 2k and 2k + 1 so the reverse of a jump mask is a swap of odd and even bits
+class LabelBits:
+    __slots__ = ('_vars', '_jumps', '_even')
+
+    def __init__(self):
+        self._vars = Interner()
+        self._jumps = Interner()  # jump names without the trailing +/-
+        self._even = 0
+
+    def vars_mask(self, variables):
+        mask = 0
+        for var in variables:
+            mask |= 1 << self._vars.intern(var)
+
+        return mask
+
+    def jumps_mask(self, jumps):
+        mask = 0
+        for jump in jumps:
+            assert jump[-1] in ['-', '+']
+            if jump[0:-1] not in self._jumps:
+                self._even |= 1 << 2 * len(self._jumps)
+            mask |= 1 << (2 * self._jumps.intern(jump[0:-1]) + (jump[-1] == '-'))
+
+        return mask
+
+    def reverse_jumps(self, mask):
+        return ((mask & self._even) << 1) | ((mask >> 1) & self._even)
+
+    def var_names(self, mask):
+        return set(self._vars.name(bit) for bit in range(mask.bit_length()) if mask >> bit & 1)
+
+    def jump_names(self, mask):
+        return set(self._jumps.name(bit // 2) + '+-'[bit % 2]
+                   for bit in range(mask.bit_length()) if mask >> bit & 1)
+
+    def encode(self, labelling):
+        return EncodedLabelling(labelling, self.vars_mask(labelling.vars),
+                                self.vars_mask(labelling.forget), self.jumps_mask(labelling.jumps))
+
+
+def _add_edge_id(first, more, node_id, edge_id):
+    if first[node_id] == -1:
+        first[node_id] = edge_id
+    else:
+        more.setdefault(node_id, []).append(edge_id)
+
+
+def _remove_edge_id(first, more, node_id, edge_id):
+    extra = more.get(node_id)
+    if first[node_id] == edge_id:
+        first[node_id] = -1 if extra is None else extra.pop(0)
+    else:
+        extra.remove(edge_id)
+    if extra is not None and len(extra) == 0:
+        del more[node_id]
+
+
+def _replace_edge_id(first, more, node_id, old_id, new_id):
+    if first[node_id] == old_id:
+        first[node_id] = new_id
+    else:
+        extra = more[node_id]
+        extra[extra.index(old_id)] = new_id
+
+
+def _edge_ids(first, more, node_id):
+    if first[node_id] == -1:
+        return ()
+
+    extra = more.get(node_id)
+    return (first[node_id],) if extra is None else [first[node_id]] + extra
+
+
+# Nodes and symbols are interned, methods working with single nodes and edges take
+# and return ids, names are used by add_edge/add_node and by the edges/nodes views
 class Graph:
+    KEPT_SEARCHES = 64  # BFS searches kept for bfs_parents, the oldest is dropped first
+
     def __init__(self):
-        self._nodes = set()
-        self._edges = []
+        self._node_ids = Interner()
+        self._symbol_ids = Interner()
+        self._is_node = bytearray()  # parent of an edge or added by add_node
+        self._inner = bytearray()  # parent of an edge with children
+        # most nodes are parent of one edge and child in one edge, the first edge id is
+        # kept in an array and only further ones in a dict
+        self._out_edge = array('l')
+        self._more_out_edges = {}
+        self._in_edge = array('l')  # first edge having the node among children
+        self._more_in_edges = {}
+        self._edge_parent = array('l')
+        self._edge_symbol = array('l')
+        self._edge_start = array('l')  # children of e are _children[start[e]:end[e]]
+        self._edge_end = array('l')
+        self._children = array('l')
+        self._removed_children = 0  # length of _children no edge uses after removals
+        self._roots = set()  # nodes not among children of any edge
+        self._bfs = {}  # source -> (BFS parent pointers, nodes left to expand), oldest first
+
+    # Pickled without the kept searches, a worker searches again what it needs
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_bfs'] = {}
+        return state
+
+    def _intern_node(self, node):
+        node_id = self._node_ids.intern(node)
+        missing = len(self._node_ids) - len(self._is_node)
+        if missing > 0:
+            self._is_node.extend(bytes(missing))
+            self._inner.extend(bytes(missing))
+            self._out_edge.extend([-1] * missing)
+            self._in_edge.extend([-1] * missing)
+
+        return node_id
 
     def add_edge(self, parent, label, children):
-        self._nodes.add(parent)
-        self._nodes.union(set(children))
-        self._edges.append(Edge(parent, label, children))
+        parent_id = self._intern_node(parent)
+        children_ids = [self._intern_node(child) for child in children]
+        edge_id = len(self._edge_parent)
+
+        self._edge_parent.append(parent_id)
+        self._edge_symbol.append(self._symbol_ids.intern(label))
+        self._edge_start.append(len(self._children))
+        self._children.extend(children_ids)
+        self._edge_end.append(len(self._children))
+
+        self._is_node[parent_id] = 1
+        if self._in_edge[parent_id] == -1:
+            self._roots.add(parent_id)
+        _add_edge_id(self._out_edge, self._more_out_edges, parent_id, edge_id)
+        for child_id in set(children_ids):
+            _add_edge_id(self._in_edge, self._more_in_edges, child_id, edge_id)
+            self._roots.discard(child_id)
+        if len(children_ids) > 0:
+            self._inner[parent_id] = 1
+        self._drop_searches(parent_id)
+
+    def remove_edge(self, edge_id):
+        # The last edge takes the id of the removed one. A parent left without edges is
+        # no longer a node of the graph.
+        parent_id = self._edge_parent[edge_id]
+        _remove_edge_id(self._out_edge, self._more_out_edges, parent_id, edge_id)
+        for child_id in set(self.edge_children(edge_id)):
+            _remove_edge_id(self._in_edge, self._more_in_edges, child_id, edge_id)
+            if self._in_edge[child_id] == -1 and self._is_node[child_id]:
+                self._roots.add(child_id)
+        self._removed_children += self._edge_end[edge_id] - self._edge_start[edge_id]
+
+        last_id = len(self._edge_parent) - 1
+        if edge_id != last_id:
+            _replace_edge_id(self._out_edge, self._more_out_edges, self._edge_parent[last_id],
+                             last_id, edge_id)
+            for child_id in set(self.edge_children(last_id)):
+                _replace_edge_id(self._in_edge, self._more_in_edges, child_id, last_id, edge_id)
+            for column in (self._edge_parent, self._edge_symbol, self._edge_start, self._edge_end):
+                column[edge_id] = column[last_id]
+        for column in (self._edge_parent, self._edge_symbol, self._edge_start, self._edge_end):
+            column.pop()
+
+        out_edges = self.out_edges(parent_id)
+        self._is_node[parent_id] = len(out_edges) > 0
+        if not self._is_node[parent_id]:
+            self._roots.discard(parent_id)
+        self._inner[parent_id] = any(self._edge_end[e] > self._edge_start[e] for e in out_edges)
+        if 2 * self._removed_children > len(self._children):
+            self._compact_children()
+        self._drop_searches(parent_id)
+
+    def _drop_searches(self, node_id):
+        # the successors of the node changed, searches which got to it start again
+        for source in [source for source, (parents, _) in self._bfs.items()
+                       if source == node_id or node_id in parents]:
+            del self._bfs[source]
+
+    def _compact_children(self):
+        children = array('l')
+        for edge_id in range(len(self._edge_parent)):
+            start = len(children)
+            children.extend(self.edge_children(edge_id))
+            self._edge_start[edge_id] = start
+            self._edge_end[edge_id] = len(children)
+        self._children = children
+        self._removed_children = 0
 
     def add_node(self, node):
-        self._nodes.add(node)
+        node_id = self._intern_node(node)
+        self._is_node[node_id] = 1
+        if self._in_edge[node_id] == -1:
+            self._roots.add(node_id)
+
+    @property
+    def node_ids(self):
+        return self._node_ids
+
+    @property
+    def symbol_ids(self):
+        return self._symbol_ids
 
     @property
     def edges(self):
-        return self._edges
+        return [self.edge(edge_id) for edge_id in range(len(self._edge_parent))]
 
     @property
     def nodes(self):
-        return self._nodes
+        return set(self._node_ids.name(node_id)
+                   for node_id, is_node in enumerate(self._is_node) if is_node)
 
-    def root(self):
-        for node in self._nodes:
-            if all([node not in edge.children for edge in self._edges]):
-                return node
+    def edge(self, edge_id):
+        return Edge(self._node_ids.name(self._edge_parent[edge_id]),
+                    self._symbol_ids.name(self._edge_symbol[edge_id]),
+                    tuple(self._node_ids.name(child) for child in self.edge_children(edge_id)))
+
+    def edge_count(self):
+        return len(self._edge_parent)
+
+    def columns(self):
+        # the arrays of the graph, not copies: parent, start and end in children of each
+        # edge, children (not all used after removals) and the inner flag of each node
+        return self._edge_parent, self._edge_start, self._edge_end, self._children, self._inner
+
+    def edge_parent(self, edge_id):
+        return self._edge_parent[edge_id]
 
-        raise RuntimeError("No root found ", self._nodes)
+    def edge_symbol(self, edge_id):
+        return self._edge_symbol[edge_id]
+
+    def edge_children(self, edge_id):
+        return self._children[self._edge_start[edge_id]:self._edge_end[edge_id]]
+
+    def has_node(self, node_id):
+        return self._is_node[node_id] == 1
+
+    def out_edges(self, node_id):
+        return _edge_ids(self._out_edge, self._more_out_edges, node_id)
+
+    def in_edges(self, node_id):
+        return _edge_ids(self._in_edge, self._more_in_edges, node_id)
+
+    def successors(self, node_id):
+        return [child for edge_id in self.out_edges(node_id)
+                for child in self.edge_children(edge_id)]
+
+    def predecessors(self, node_id):
+        return [self._edge_parent[edge_id] for edge_id in self.in_edges(node_id)]
+
+    def is_leaf(self, node_id):
+        return self._inner[node_id] == 0
+
+    def bfs_parents(self, node_id, target=None):
+        # nodes reachable by a non-empty path from the node, mapped to their BFS parent,
+        # with a target at least those found until it. The search is kept until an edit
+        # gets to it and a later call goes on with it.
+        search = self._bfs.get(node_id)
+        if search is None:
+            if len(self._bfs) >= self.KEPT_SEARCHES:
+                del self._bfs[next(iter(self._bfs))]
+            search = self._bfs[node_id] = ({}, collections.deque([node_id]))
+        parents, todo = search
+        while len(todo) > 0 and target not in parents:
+            node = todo.popleft()
+            for child in self.successors(node):
+                if child not in parents:
+                    parents[child] = node
+                    todo.append(child)
+
+        return parents
+
+    def find_path(self, node1, node2):
+        parents = self.bfs_parents(node1, node2)
+        if node2 not in parents:
+            return None
+
+        path = [node2]
+        while path[-1] != node1:
+            path.append(parents[path[-1]])
+
+        return path[::-1]
+
+    def root(self):
+        # the first root, the only one of a graph that is not a forest
+        if len(self._roots) == 0:
+            raise RuntimeError("No root found ", self.nodes)
+
+        return self._node_ids.name(min(self._roots))
+
+    def root_ids(self):
+        return sorted(self._roots)
+
+    def roots(self):
+        return [self._node_ids.name(node_id) for node_id in self.root_ids()]
+
+    def components(self):
+        # Weakly connected components as graphs in the order of their first nodes, node
+        # and edge ids keep their order
+        component = list(range(len(self._node_ids)))  # union-find parents
+
+        def find(node_id):
+            while component[node_id] != node_id:
+                component[node_id] = component[component[node_id]]
+                node_id = component[node_id]
+            return node_id
+
+        for edge_id in range(len(self._edge_parent)):
+            for child_id in self.edge_children(edge_id):
+                first, second = sorted((find(self._edge_parent[edge_id]), find(child_id)))
+                component[second] = first
+
+        graphs = {}
+        for node_id in range(len(self._node_ids)):
+            if self._is_node[node_id] or self._in_edge[node_id] != -1:
+                graph = graphs.setdefault(find(node_id), Graph())
+                graph._intern_node(self._node_ids.name(node_id))
+        for parent, symbol, children in self.edges:
+            graphs[find(self._node_ids.id(parent))].add_edge(parent, symbol, children)
+        for node_id in range(len(self._node_ids)):
+            if self._is_node[node_id] and self._out_edge[node_id] == -1:
+                graphs[find(node_id)].add_node(self._node_ids.name(node_id))
+
+        return list(graphs.values())
 
     def __iter__(self):
-        return self._edges.__iter__()
+        return self.edges.__iter__()
 
     def __str__(self):
-        res = "Nodes: " + str(self._nodes)
-        res += "Edges: " + str(self._edges)
+        res = "Nodes: " + str(self.nodes)
+        res += "Edges: " + str(self.edges)
 
         return res
 
 
+# States and symbols are interned by compile(), the lookup methods take and return ids,
+# a transition id is its position in transitions
 class GraphAutomaton:
     def __init__(self):
         self._transitions = []
+        self._state_ids = Interner()
+        self._symbol_ids = Interner()
+        self._label_bits = LabelBits()
+        self._index = None  # built on demand by compile()
+        self._child_index = None
+        self._symbol_index = None
+        self._trans_state = None
+        self._trans_symbol = None
+        self._trans_children = None
+        self._labellings = None
+        self._masks = None  # (vars, forget, jumps) of unpickled transitions
+
+    # Pickled compiled as arrays of ids and masks, transitions and labellings are made
+    # again only when asked for
+    def __getstate__(self):
+        self.compile()
+        children = array('l')
+        starts = array('l', [0])
+        for trans_children in self._trans_children:
+            children.extend(trans_children)
+            starts.append(len(children))
+        masks = [[labelling.vars for labelling in self._labellings],
+                 [labelling.forget for labelling in self._labellings],
+                 [labelling.jumps for labelling in self._labellings]]
+
+        return (self._state_ids, self._symbol_ids, self._label_bits, self._trans_state,
+                self._trans_symbol, children, starts, masks)
+
+    def __setstate__(self, state):
+        self._state_ids, self._symbol_ids, self._label_bits, self._trans_state, \
+            self._trans_symbol, children, starts, masks = state
+        self._trans_children = [tuple(children[starts[i]:starts[i + 1]])
+                                for i in range(len(starts) - 1)]
+        self._masks = list(zip(*masks))
+        self._transitions = None
+        self._labellings = [None] * len(self._trans_state)
+        self._build_indexes()
 
     def __str__(self):
-        res = "States: " + str(set([trans.parent for trans in self._transitions]).union(
-            [c for trans in self._transitions for c in trans.children]))
-        res += "Symbols: " + str(set([s for (_, s, _) in self._transitions]))
-        res += "Transition: " + str(self._transitions)
+        res = "States: " + str(set([trans.parent for trans in self.transitions]).union(
+            [c for trans in self.transitions for c in trans.children]))
+        res += "Symbols: " + str(set([s for (_, s, _) in self.transitions]))
+        res += "Transition: " + str(self.transitions)
 
         return res
 
     def __iter__(self):
-        return self._transitions.__iter__()
+        return self.transitions.__iter__()
 
     @property
     def transitions(self):
+        if self._transitions is None:
+            self._transitions = [self._unpack_transition(trans_id)
+                                 for trans_id in range(len(self._trans_state))]
+
         return self._transitions
 
-    def add_create_transition(self, transition):
-        self._transitions.append(transition)
+    @property
+    def transition_count(self):
+        # without decoding unpickled transitions
+        return len(self._trans_state if self._transitions is None else self._transitions)
 
-    def add_transition(self, parent, symbol, children, variables, forget, jumps):
-        self._transitions.append(Trans(parent, symbol, children, variables, forget, jumps))
+    @property
+    def state_ids(self):
+        if self._index is None:
+            self.compile()
+
+        return self._state_ids
+
+    @property
+    def symbol_ids(self):
+        if self._index is None:
+            self.compile()
+
+        return self._symbol_ids
 
+    @property
+    def label_bits(self):
+        return self._label_bits
+
+    def add_create_transition(self, transition):
+        self.transitions.append(transition)
+        self._index = None
 
+    def add_transition(self, parent, symbol, children, variables, forget, jumps):
+        self.add_create_transition(Trans(parent, symbol, children, variables, forget, jumps))
+
+    def compile(self):
+        if self._index is not None:
+            return
+
+        trans_state = array('l')
+        trans_symbol = array('l')
+        trans_children = []
+        labellings = []
+        for trans in self.transitions:
+            trans_symbol.append(self._symbol_ids.intern(trans.symbol))
+            trans_children.append(tuple(self._state_ids.intern(state) for state in trans.children))
+            trans_state.append(self._state_ids.intern(trans.parent))
+            labellings.append(self._label_bits.encode(
+                Labelling(trans.parent, trans.vars, trans.forget, trans.jumps)))
+
+        self._trans_state = trans_state
+        self._trans_symbol = trans_symbol
+        self._trans_children = trans_children
+        self._labellings = labellings
+        self._masks = None
+        self._build_indexes()
+
+    def _build_indexes(self):
+        index = {}
+        child_index = set()
+        symbol_index = {}
+        for trans_id, children in enumerate(self._trans_children):
+            symbol = self._trans_symbol[trans_id]
+            index.setdefault((symbol, len(children), children), []).append(trans_id)
+            child_index.update((symbol, len(children), position, state)
+                               for position, state in enumerate(children))
+            symbol_index.setdefault((symbol, len(children)), []).append(trans_id)
+
+        self._index = index
+        self._child_index = child_index
+        self._symbol_index = symbol_index
+
+    def _unpack_transition(self, trans_id):
+        labelling = self.encoded_labelling(trans_id).labelling
+        return Trans(labelling.state, self._symbol_ids.name(self._trans_symbol[trans_id]),
+                     tuple(self._state_ids.name(c) for c in self._trans_children[trans_id]),
+                     labelling.vars, labelling.forget, labelling.jumps)
+
+    def candidates(self, symbol, children_states):
+        if self._index is None:
+            self.compile()
+
+        return self._index.get((symbol, len(children_states), children_states), [])
+
+    def symbol_transitions(self, symbol, arity):
+        if self._index is None:
+            self.compile()
+
+        return self._symbol_index.get((symbol, arity), [])
+
+    def allows_child(self, symbol, arity, position, state):
+        if self._index is None:
+            self.compile()
+
+        return (symbol, arity, position, state) in self._child_index
+
+    def transition_state(self, trans_id):
+        return self._trans_state[trans_id]
+
+    def transition_children(self, trans_id):
+        return self._trans_children[trans_id]
+
+    def encoded_labelling(self, trans_id):
+        labelling = self._labellings[trans_id]
+        if labelling is None:
+            variables, forget, jumps = self._masks[trans_id]
+            names = Labelling(self._state_ids.name(self._trans_state[trans_id]),
+                              self._label_bits.var_names(variables),
+                              self._label_bits.var_names(forget),
+                              self._label_bits.jump_names(jumps))
+            labelling = EncodedLabelling(names, variables, forget, jumps)
+            self._labellings[trans_id] = labelling
+
+        return labelling
+
+
+# Labellings are kept by id of the nodes interner (the graph one for runs of a graph),
+# states by id of the states interner and encoded by the label bits (the automaton ones)
 class Run:
-    def __init__(self):
-        self._mapping = {}
+    __slots__ = ('_nodes', '_states', '_label_bits', '_labels', '_state_of')
+
+    def __init__(self, nodes=None, states=None, label_bits=None):
+        self._nodes = Interner() if nodes is None else nodes
+        self._states = Interner() if states is None else states
+        self._label_bits = LabelBits() if label_bits is None else label_bits
+        self._labels = []  # node id -> EncodedLabelling, None when not mapped
+        self._state_of = array('l')  # node id -> state id, -1 when not mapped
 
     def __getitem__(self, node):
-        return self._mapping[node]
+        return self.at(node)
+
+    def copy(self):
+        # the labellings are shared, they are never changed
+        run = Run(self._nodes, self._states, self._label_bits)
+        run._labels = list(self._labels)
+        run._state_of = array('l', self._state_of)
+        return run
 
     def __contains__(self, item):
-        return item in self._mapping
+        node_id = self._nodes.get(item)
+        return node_id != -1 and self.labelling(node_id) is not None
 
     def __iter__(self):
-        return self._mapping.__iter__()
+        return (self._nodes.name(node_id) for node_id, label in enumerate(self._labels)
+                if label is not None)
 
     def __str__(self):
         res = ""
-        for node in self._mapping.keys():
-            res += node + " -> " + str(self._mapping[node]) + '\n'
+        for node in self:
+            res += node + " -> " + str(self.at(node)) + '\n'
 
         return res
 
+    @property
+    def nodes(self):
+        return self._nodes
+
+    @property
+    def states(self):
+        return self._states
+
+    @property
+    def label_bits(self):
+        return self._label_bits
+
     def at(self, node):
-        return self._mapping[node]
+        label = self.labelling(self._nodes.get(node))
+        if label is None:
+            raise KeyError(node)
+
+        return label
 
     def map(self, node, state, variables, forgot, jump):
-        if node in self._mapping.keys():
+        self.map_id(self._nodes.intern(node), self._states.intern(state),
+                    self._label_bits.encode(Labelling(state, variables, forgot, jump)))
+
+    def map_id(self, node_id, state_id, encoded_labelling):
+        missing = node_id + 1 - len(self._labels)
+        if missing > 0:
+            self._labels.extend([None] * missing)
+            self._state_of.extend([-1] * missing)
+        if self._labels[node_id] is not None:
             raise RuntimeError("This node has been already mapped")
 
-        self._mapping[node] = Labelling(state, variables, forgot, jump)
+        self._labels[node_id] = encoded_labelling
+        self._state_of[node_id] = state_id
+
+    def unmap(self, node):
+        node_id = self._nodes.get(node)
+        if node_id == -1 or self.labelling(node_id) is None:
+            raise RuntimeError("This nodes has not been mapped")
+
+        self.unmap_id(node_id)
+
+    def unmap_id(self, node_id):
+        self._labels[node_id] = None
+        self._state_of[node_id] = -1
+
+    def encoded(self, node_id):
+        return self._labels[node_id] if 0 <= node_id < len(self._labels) else None
+
+    def labelling(self, node_id):
+        encoded = self.encoded(node_id)
+        return None if encoded is None else encoded.labelling
+
+    def state_id(self, node_id):
+        return self._state_of[node_id] if 0 <= node_id < len(self._state_of) else -1
 
     def get_state(self, node):
-        if node not in self._mapping:
+        node_id = self._nodes.get(node)
+        if self.labelling(node_id) is None:
             raise RuntimeError("This nodes has not been mapped")
 
-        return self._mapping[node].state
+        return self._labels[node_id].labelling.state
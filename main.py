@@ -1,163 +1,252 @@
 #! /usr/bin/python3
 
+import argparse
+import sys
+
+import graph_io
 import graph_types
 import graph_run
-
-
-def run(automaton, graph):
-    res = None
-    while res is None:
-        try:
-            print("====New try====")
-            res = graph_run.automaton_run(automaton, graph)
-        except RuntimeError:
-            continue
-
-
-graph0 = graph_types.Graph()
-graph0.add_edge('1', 'npt', ('2', '0', '3r'))
-graph0.add_edge('2', 'npt', ('3', '1r', '3r'))
-graph0.add_edge('3', 'npt', ('0', '2r', '0'))
-graph0.add_edge('1r', '-', ())
-graph0.add_edge('2r', '-', ())
-graph0.add_edge('3r', '-', ())
-graph0.add_edge('0', '-', ())
-
-automaton0 = graph_types.GraphAutomaton()
-automaton0.add_transition('q1', 'npt', ('q2', 'q0', 'q3r'), set('x'), set(), set())
-automaton0.add_transition('q2', 'npt', ('q3', 'q1r', 'q3r'), set('y'), set(), set())
-automaton0.add_transition('q3', 'npt', ('q0', 'q2r', 'q0'), set('z'), set(), set())
-automaton0.add_transition('q0', '-', (), set(), set(), set())
-automaton0.add_transition('q1r', '-', (), set('x'), set(), set())
-automaton0.add_transition('q2r', '-', (), set('y'), set(), set())
-automaton0.add_transition('q3r', '-', (), set('z'), set(), set())
-
-run(automaton0, graph0)
-
-graph1 = graph_types.Graph()
-graph1.add_edge('1', 'npt', ('2r', '0', '3'))
-graph1.add_edge('3', 'npt', ('0', '2', '3r'))
-graph1.add_edge('2', 'npt', ('3r', '1r', '3r'))
-graph1.add_edge('1r', '-', ())
-graph1.add_edge('2r', '-', ())
-graph1.add_edge('3r', '-', ())
-graph1.add_edge('0', '-', ())
-
-automaton1 = graph_types.GraphAutomaton()
-automaton1.add_transition('q1', 'npt', ('q2', 'q0', 'q3r'), set('x'), set(), set())
-automaton1.add_transition('q2', 'npt', ('q3', 'q1r', 'q3r'), set('y'), set(), set())
-automaton1.add_transition('q3', 'npt', ('q0', 'q2r', 'q0'), set('z'), set(), set())
-automaton1.add_transition('q1', 'npt', ('q2r', 'q0', 'q3'), set('x'), set(), set(['q3+', 'q2-']))
-automaton1.add_transition('q3', 'npt', ('q0', 'q2', 'q3r'), set('z'), set(), set(['q2+']))
-automaton1.add_transition('q2', 'npt', ('q3r', 'q1r', 'q3r'), set('y'), set(), set(['q3-']))
-automaton1.add_transition('q0', '-', (), set(), set(), set())
-automaton1.add_transition('q1r', '-', (), set('x'), set(), set())
-automaton1.add_transition('q2r', '-', (), set('y'), set(), set())
-automaton1.add_transition('q3r', '-', (), set('z'), set(), set())
-
-run(automaton1, graph1)
-
-graph2 = graph_types.Graph()
-graph2.add_edge('1', 'npt', ('2', '0', '0'))
-graph2.add_edge('2', 'npt', ('3', '1r', '1r'))
-graph2.add_edge('3', 'npt', ('4', '2r', '1r'))
-graph2.add_edge('4', 'npt', ('5', '3r', '6r'))
-graph2.add_edge('5', 'npt', ('6', '4r', '6r'))
-graph2.add_edge('6', 'npt', ('0', '5r', '1r'))
-graph2.add_edge('1r', '1', ())
-graph2.add_edge('2r', '2', ())
-graph2.add_edge('3r', '3', ())
-graph2.add_edge('4r', '4', ())
-graph2.add_edge('5r', '5', ())
-graph2.add_edge('6r', '6', ())
-graph2.add_edge('0', '0', ())
-
-automaton2 = graph_types.GraphAutomaton()
-automaton2.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set())
-automaton2.add_transition('q2', 'npt', ('q3', 'q1r', 'q1r'), set('b'), set(), set())
-automaton2.add_transition('q3', 'npt', ('q4', 'q2r', 'q1r'), set('c'), set(), set())
-automaton2.add_transition('q4', 'npt', ('q5', 'q3r', 'q6r'), set('d'), set(), set())
-automaton2.add_transition('q5', 'npt', ('q6', 'q4r', 'q6r'), set('e'), set(), set())
-automaton2.add_transition('q6', 'npt', ('q0', 'q5r', 'q1r'), set('f'), set(), set())
-automaton2.add_transition('q1r', '1', (), set('a'), set(), set())
-automaton2.add_transition('q2r', '2', (), set('b'), set(), set())
-automaton2.add_transition('q3r', '3', (), set('c'), set(), set())
-automaton2.add_transition('q4r', '4', (), set('d'), set(), set())
-automaton2.add_transition('q5r', '5', (), set('e'), set(), set())
-automaton2.add_transition('q6r', '6', (), set('f'), set(), set())
-automaton2.add_transition('q0', '0', (), set(), set(), set())
-
-run(automaton2, graph2)
-
-graph3 = graph_types.Graph()
-graph3.add_edge('1', 'npt', ('2', '0', '0'))
-graph3.add_edge('2', 'npt', ('3r', '1r', '1r'))
-graph3.add_edge('3', 'npt', ('4', '2r', '1r'))
-graph3.add_edge('4', 'npt', ('5', '3r', '6r'))
-graph3.add_edge('5', 'npt', ('6', '4r', '6r'))
-graph3.add_edge('6', 'npt', ('0', '5r', '1'))
-graph3.add_edge('1r', '1', ())
-graph3.add_edge('2r', '2', ())
-graph3.add_edge('3r', '3', ())
-graph3.add_edge('4r', '4', ())
-graph3.add_edge('5r', '5', ())
-graph3.add_edge('6r', '6', ())
-graph3.add_edge('0', '0', ())
-
-automaton3 = graph_types.GraphAutomaton()
-automaton3.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set())
-automaton3.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set(['q1-']))
-automaton3.add_transition('q2', 'npt', ('q3', 'q1r', 'q1r'), set('b'), set(), set())
-automaton3.add_transition('q2', 'npt', ('q3r', 'q1r', 'q1r'), set('b'), set(), set(['q3-']))
-automaton3.add_transition('q3', 'npt', ('q4', 'q2r', 'q1r'), set('c'), set(), set(['q3+']))
-automaton3.add_transition('q4', 'npt', ('q5', 'q3r', 'q6r'), set('d'), set(), set())
-automaton3.add_transition('q5', 'npt', ('q6', 'q4r', 'q6r'), set('e'), set(), set())
-automaton3.add_transition('q6', 'npt', ('q0', 'q5r', 'q1r'), set('f'), set(), set())
-automaton3.add_transition('q6', 'npt', ('q0', 'q5r', 'q1'), set('f'), set(), set(['q1+']))
-automaton3.add_transition('q1r', '1', (), set('a'), set(), set())
-automaton3.add_transition('q2r', '2', (), set('b'), set(), set())
-automaton3.add_transition('q3r', '3', (), set('c'), set(), set())
-automaton3.add_transition('q4r', '4', (), set('d'), set(), set())
-automaton3.add_transition('q5r', '5', (), set('e'), set(), set())
-automaton3.add_transition('q6r', '6', (), set('f'), set(), set())
-automaton3.add_transition('q0', '0', (), set(), set(), set())
-
-run(automaton3, graph3)
-
-automaton4 = graph_types.GraphAutomaton()
-automaton4.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set())
-automaton4.add_transition('q2', 'npt', ('q1', 'q1r', 'q1r'), set('b'), set(), set())
-automaton4.add_transition('q1', 'npt', ('q2', 'q2r', 'q1r'), set('a'), set(['a']), set())
-automaton4.add_transition('q2', 'npt', ('q1', 'q3r', 'q6r'), set('b'), set(['b']), set())
-automaton4.add_transition('q1', 'npt', ('q2', 'q4r', 'q6r'), set('a'), set(['a']), set())
-automaton4.add_transition('q2', 'npt', ('q0', 'q5r', 'q1r'), set('b'), set(['b']), set())
-automaton4.add_transition('q1r', '1', (), set('a'), set(), set())
-automaton4.add_transition('q2r', '2', (), set('b'), set(), set())
-automaton4.add_transition('q3r', '3', (), set('a'), set(), set())
-automaton4.add_transition('q4r', '4', (), set('b'), set(), set())
-automaton4.add_transition('q5r', '5', (), set('a'), set(), set())
-automaton4.add_transition('q6r', '6', (), set('b'), set(), set())
-automaton4.add_transition('q0', '0', (), set(), set(), set())
-
-run(automaton4, graph2)
-
-automaton5 = graph_types.GraphAutomaton()
-automaton5.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set())
-automaton5.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set(['q1-']))
-automaton5.add_transition('q2', 'npt', ('q1', 'q1r', 'q1r'), set('b'), set(), set())
-automaton5.add_transition('q2', 'npt', ('q3r', 'q1r', 'q1r'), set('b'), set(), set(['q3-']))
-automaton5.add_transition('q1', 'npt', ('q2', 'q2r', 'q1r'), set('a'), set(['a']), set())
-automaton5.add_transition('q3', 'npt', ('q2', 'q2r', 'q1r'), set('a'), set(['a']), set(['q3+']))
-automaton5.add_transition('q2', 'npt', ('q1', 'q3r', 'q6r'), set('b'), set(['b']), set())
-automaton5.add_transition('q1', 'npt', ('q2', 'q4r', 'q6r'), set('a'), set(['a']), set())
-automaton5.add_transition('q2', 'npt', ('q0', 'q5r', 'q1'), set('b'), set(['b']), set(['q1+']))
-automaton4.add_transition('q2', 'npt', ('q0', 'q5r', 'q1r'), set('b'), set(['b']), set())
-automaton5.add_transition('q1r', '1', (), set('a'), set(), set())
-automaton5.add_transition('q2r', '2', (), set('b'), set(), set())
-automaton5.add_transition('q3r', '3', (), set('a'), set(), set())
-automaton5.add_transition('q4r', '4', (), set('b'), set(), set())
-automaton5.add_transition('q5r', '5', (), set('a'), set(), set())
-automaton5.add_transition('q6r', '6', (), set('b'), set(), set())
-automaton5.add_transition('q0', '0', (), set(), set(), set())
-
-run(automaton5, graph3)
+import graph_parallel
+import graph_minimize
+import graph_numpy
+import graph_search
+
+
+def run(automaton, graph, mode='random', propagate=False, minimize=False, stats=None,
+        cache=None, backend='python', seed=0, attempts=1000, timeout=None, restarts='luby'):
+    # cache keeps states of sub-DAGs of graphs run before with the same automaton, random
+    # runs are searched for until attempts or timeout seconds run out, None for no limit
+    if minimize:
+        automaton, report = graph_minimize.minimize(automaton)
+        print(report)
+        cache = None
+
+    result = None
+    if len(graph.root_ids()) > 1:
+        # components of a forest are run apart, random ones in place of parallel
+        result = graph_parallel.forest_run(automaton, graph,
+                                           'random' if mode == 'parallel' else mode, seed=seed,
+                                           propagate=propagate, attempts=attempts,
+                                           timeout=timeout, restarts=restarts, stats=stats,
+                                           backend=backend, cache=cache)
+    elif mode in ['search', 'table']:
+        res = graph_run.automaton_search(automaton, graph, stats) if mode == 'search' \
+            else graph_run.automaton_table_run(automaton, graph, cache, stats)
+    elif mode == 'parallel':
+        result = graph_parallel.parallel_run(automaton, graph, attempts=attempts,
+                                             timeout=timeout, seed=seed, propagate=propagate,
+                                             cache=cache, stats=stats)
+    else:
+        result = graph_search.search_run(automaton, graph, seed, attempts, timeout, restarts,
+                                         propagate=propagate, cache=cache, stats=stats,
+                                         backend=backend)
+    if result is not None:
+        if result.status == 'unknown':
+            print("Unknown, no run found in", result.attempts, "attempts")
+            return None
+        res = result.run
+
+    print("Final run:" if res is not None else "No run exists")
+    print(res)
+    return res
+
+
+def examples():
+    graph0 = graph_types.Graph()
+    graph0.add_edge('1', 'npt', ('2', '0', '3r'))
+    graph0.add_edge('2', 'npt', ('3', '1r', '3r'))
+    graph0.add_edge('3', 'npt', ('0', '2r', '0'))
+    graph0.add_edge('1r', '-', ())
+    graph0.add_edge('2r', '-', ())
+    graph0.add_edge('3r', '-', ())
+    graph0.add_edge('0', '-', ())
+
+    automaton0 = graph_types.GraphAutomaton()
+    automaton0.add_transition('q1', 'npt', ('q2', 'q0', 'q3r'), set('x'), set(), set())
+    automaton0.add_transition('q2', 'npt', ('q3', 'q1r', 'q3r'), set('y'), set(), set())
+    automaton0.add_transition('q3', 'npt', ('q0', 'q2r', 'q0'), set('z'), set(), set())
+    automaton0.add_transition('q0', '-', (), set(), set(), set())
+    automaton0.add_transition('q1r', '-', (), set('x'), set(), set())
+    automaton0.add_transition('q2r', '-', (), set('y'), set(), set())
+    automaton0.add_transition('q3r', '-', (), set('z'), set(), set())
+
+    run(automaton0, graph0)
+
+    graph1 = graph_types.Graph()
+    graph1.add_edge('1', 'npt', ('2r', '0', '3'))
+    graph1.add_edge('3', 'npt', ('0', '2', '3r'))
+    graph1.add_edge('2', 'npt', ('3r', '1r', '3r'))
+    graph1.add_edge('1r', '-', ())
+    graph1.add_edge('2r', '-', ())
+    graph1.add_edge('3r', '-', ())
+    graph1.add_edge('0', '-', ())
+
+    automaton1 = graph_types.GraphAutomaton()
+    automaton1.add_transition('q1', 'npt', ('q2', 'q0', 'q3r'), set('x'), set(), set())
+    automaton1.add_transition('q2', 'npt', ('q3', 'q1r', 'q3r'), set('y'), set(), set())
+    automaton1.add_transition('q3', 'npt', ('q0', 'q2r', 'q0'), set('z'), set(), set())
+    automaton1.add_transition('q1', 'npt', ('q2r', 'q0', 'q3'), set('x'), set(), set(['q3+', 'q2-']))
+    automaton1.add_transition('q3', 'npt', ('q0', 'q2', 'q3r'), set('z'), set(), set(['q2+']))
+    automaton1.add_transition('q2', 'npt', ('q3r', 'q1r', 'q3r'), set('y'), set(), set(['q3-']))
+    automaton1.add_transition('q0', '-', (), set(), set(), set())
+    automaton1.add_transition('q1r', '-', (), set('x'), set(), set())
+    automaton1.add_transition('q2r', '-', (), set('y'), set(), set())
+    automaton1.add_transition('q3r', '-', (), set('z'), set(), set())
+
+    run(automaton1, graph1)
+
+    graph2 = graph_types.Graph()
+    graph2.add_edge('1', 'npt', ('2', '0', '0'))
+    graph2.add_edge('2', 'npt', ('3', '1r', '1r'))
+    graph2.add_edge('3', 'npt', ('4', '2r', '1r'))
+    graph2.add_edge('4', 'npt', ('5', '3r', '6r'))
+    graph2.add_edge('5', 'npt', ('6', '4r', '6r'))
+    graph2.add_edge('6', 'npt', ('0', '5r', '1r'))
+    graph2.add_edge('1r', '1', ())
+    graph2.add_edge('2r', '2', ())
+    graph2.add_edge('3r', '3', ())
+    graph2.add_edge('4r', '4', ())
+    graph2.add_edge('5r', '5', ())
+    graph2.add_edge('6r', '6', ())
+    graph2.add_edge('0', '0', ())
+
+    automaton2 = graph_types.GraphAutomaton()
+    automaton2.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set())
+    automaton2.add_transition('q2', 'npt', ('q3', 'q1r', 'q1r'), set('b'), set(), set())
+    automaton2.add_transition('q3', 'npt', ('q4', 'q2r', 'q1r'), set('c'), set(), set())
+    automaton2.add_transition('q4', 'npt', ('q5', 'q3r', 'q6r'), set('d'), set(), set())
+    automaton2.add_transition('q5', 'npt', ('q6', 'q4r', 'q6r'), set('e'), set(), set())
+    automaton2.add_transition('q6', 'npt', ('q0', 'q5r', 'q1r'), set('f'), set(), set())
+    automaton2.add_transition('q1r', '1', (), set('a'), set(), set())
+    automaton2.add_transition('q2r', '2', (), set('b'), set(), set())
+    automaton2.add_transition('q3r', '3', (), set('c'), set(), set())
+    automaton2.add_transition('q4r', '4', (), set('d'), set(), set())
+    automaton2.add_transition('q5r', '5', (), set('e'), set(), set())
+    automaton2.add_transition('q6r', '6', (), set('f'), set(), set())
+    automaton2.add_transition('q0', '0', (), set(), set(), set())
+
+    run(automaton2, graph2)
+
+    graph3 = graph_types.Graph()
+    graph3.add_edge('1', 'npt', ('2', '0', '0'))
+    graph3.add_edge('2', 'npt', ('3r', '1r', '1r'))
+    graph3.add_edge('3', 'npt', ('4', '2r', '1r'))
+    graph3.add_edge('4', 'npt', ('5', '3r', '6r'))
+    graph3.add_edge('5', 'npt', ('6', '4r', '6r'))
+    graph3.add_edge('6', 'npt', ('0', '5r', '1'))
+    graph3.add_edge('1r', '1', ())
+    graph3.add_edge('2r', '2', ())
+    graph3.add_edge('3r', '3', ())
+    graph3.add_edge('4r', '4', ())
+    graph3.add_edge('5r', '5', ())
+    graph3.add_edge('6r', '6', ())
+    graph3.add_edge('0', '0', ())
+
+    automaton3 = graph_types.GraphAutomaton()
+    automaton3.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set())
+    automaton3.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set(['q1-']))
+    automaton3.add_transition('q2', 'npt', ('q3', 'q1r', 'q1r'), set('b'), set(), set())
+    automaton3.add_transition('q2', 'npt', ('q3r', 'q1r', 'q1r'), set('b'), set(), set(['q3-']))
+    automaton3.add_transition('q3', 'npt', ('q4', 'q2r', 'q1r'), set('c'), set(), set(['q3+']))
+    automaton3.add_transition('q4', 'npt', ('q5', 'q3r', 'q6r'), set('d'), set(), set())
+    automaton3.add_transition('q5', 'npt', ('q6', 'q4r', 'q6r'), set('e'), set(), set())
+    automaton3.add_transition('q6', 'npt', ('q0', 'q5r', 'q1r'), set('f'), set(), set())
+    automaton3.add_transition('q6', 'npt', ('q0', 'q5r', 'q1'), set('f'), set(), set(['q1+']))
+    automaton3.add_transition('q1r', '1', (), set('a'), set(), set())
+    automaton3.add_transition('q2r', '2', (), set('b'), set(), set())
+    automaton3.add_transition('q3r', '3', (), set('c'), set(), set())
+    automaton3.add_transition('q4r', '4', (), set('d'), set(), set())
+    automaton3.add_transition('q5r', '5', (), set('e'), set(), set())
+    automaton3.add_transition('q6r', '6', (), set('f'), set(), set())
+    automaton3.add_transition('q0', '0', (), set(), set(), set())
+
+    run(automaton3, graph3)
+
+    automaton4 = graph_types.GraphAutomaton()
+    automaton4.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set())
+    automaton4.add_transition('q2', 'npt', ('q1', 'q1r', 'q1r'), set('b'), set(), set())
+    automaton4.add_transition('q1', 'npt', ('q2', 'q2r', 'q1r'), set('a'), set(['a']), set())
+    automaton4.add_transition('q2', 'npt', ('q1', 'q3r', 'q6r'), set('b'), set(['b']), set())
+    automaton4.add_transition('q1', 'npt', ('q2', 'q4r', 'q6r'), set('a'), set(['a']), set())
+    automaton4.add_transition('q2', 'npt', ('q0', 'q5r', 'q1r'), set('b'), set(['b']), set())
+    automaton4.add_transition('q1r', '1', (), set('a'), set(), set())
+    automaton4.add_transition('q2r', '2', (), set('b'), set(), set())
+    automaton4.add_transition('q3r', '3', (), set('a'), set(), set())
+    automaton4.add_transition('q4r', '4', (), set('b'), set(), set())
+    automaton4.add_transition('q5r', '5', (), set('a'), set(), set())
+    automaton4.add_transition('q6r', '6', (), set('b'), set(), set())
+    automaton4.add_transition('q0', '0', (), set(), set(), set())
+
+    run(automaton4, graph2)
+
+    automaton5 = graph_types.GraphAutomaton()
+    automaton5.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set())
+    automaton5.add_transition('q1', 'npt', ('q2', 'q0', 'q0'), set('a'), set(), set(['q1-']))
+    automaton5.add_transition('q2', 'npt', ('q1', 'q1r', 'q1r'), set('b'), set(), set())
+    automaton5.add_transition('q2', 'npt', ('q3r', 'q1r', 'q1r'), set('b'), set(), set(['q3-']))
+    automaton5.add_transition('q1', 'npt', ('q2', 'q2r', 'q1r'), set('a'), set(['a']), set())
+    automaton5.add_transition('q3', 'npt', ('q2', 'q2r', 'q1r'), set('a'), set(['a']), set(['q3+']))
+    automaton5.add_transition('q2', 'npt', ('q1', 'q3r', 'q6r'), set('b'), set(['b']), set())
+    automaton5.add_transition('q1', 'npt', ('q2', 'q4r', 'q6r'), set('a'), set(['a']), set())
+    automaton5.add_transition('q2', 'npt', ('q0', 'q5r', 'q1'), set('b'), set(['b']), set(['q1+']))
+    automaton4.add_transition('q2', 'npt', ('q0', 'q5r', 'q1r'), set('b'), set(['b']), set())
+    automaton5.add_transition('q1r', '1', (), set('a'), set(), set())
+    automaton5.add_transition('q2r', '2', (), set('b'), set(), set())
+    automaton5.add_transition('q3r', '3', (), set('a'), set(), set())
+    automaton5.add_transition('q4r', '4', (), set('b'), set(), set())
+    automaton5.add_transition('q5r', '5', (), set('a'), set(), set())
+    automaton5.add_transition('q6r', '6', (), set('b'), set(), set())
+    automaton5.add_transition('q0', '0', (), set(), set(), set())
+
+    run(automaton4, graph2, minimize=True)  # drops the transition added twice to automaton4
+    run(automaton5, graph3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a graph automaton over graphs, "
+                                     "with the examples run when no files are given.")
+    parser.add_argument('automaton', nargs='?', help="automaton file, - for stdin")
+    parser.add_argument('graphs', nargs='*', help="graph files, - for stdin")
+    parser.add_argument('--mode', default='random',
+                        choices=['random', 'search', 'table', 'parallel'])
+    parser.add_argument('--propagate', action='store_true')
+    parser.add_argument('--minimize', action='store_true')
+    parser.add_argument('--cache', metavar='DIR', help="cache of compiled automata")
+    parser.add_argument('--stats', action='store_true', help="print run statistics")
+    parser.add_argument('--backend', default='python', choices=['python', 'numpy'],
+                        help="verification of random runs")
+    parser.add_argument('--seed', type=int, default=0, help="seed of random runs")
+    parser.add_argument('--attempts', type=int, default=1000,
+                        help="random runs tried at most, 0 for no limit")
+    parser.add_argument('--timeout', type=float, help="seconds for random runs of a graph")
+    parser.add_argument('--restarts', default='luby', choices=['luby', 'geometric'])
+    args = parser.parse_args(argv)
+    if args.backend == 'numpy' and not graph_numpy.available():
+        parser.error("the numpy backend needs numpy")
+
+    if args.automaton is None:
+        examples()
+        return 0
+
+    automaton = graph_io.load_automaton_file(args.automaton, args.cache)
+    if args.minimize:
+        # once for all graphs, the cache keeps states of the minimized automaton
+        automaton, report = graph_minimize.minimize(automaton)
+        print(report)
+    cache = graph_run.SubgraphCache(automaton)
+    failed = 0
+    for path in args.graphs or ['-']:
+        print("====" + path + "====")
+        graph = graph_io.load_graph_file(path)
+        stats = graph_run.RunStats() if args.stats else None
+        if run(automaton, graph, args.mode, args.propagate, False, stats, cache,
+               args.backend, args.seed, args.attempts or None, args.timeout, args.restarts) is None:
+            failed += 1
+        if stats is not None:
+            print(stats.as_dict())
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#! /usr/bin/python3
+
+import random
+import unittest
+
+import graph_incremental
+import graph_run
+import graph_types
+
+
+def _chain_automaton(f_vars=()):
+    automaton = graph_types.GraphAutomaton()
+    automaton.add_transition('q', 'f', ('q',), set(f_vars), set(), set())
+    automaton.add_transition('q', 'g', ('q', 'q'), set(), set(), set())
+    automaton.add_transition('q', 'l', (), set(), set(), set())
+    return automaton
+
+
+def _edge_of(graph, node):
+    return graph.out_edges(graph.node_ids.id(node))[0]
+
+
+class IncrementalRunTest(unittest.TestCase):
+    def test_edit_of_jump_partner(self):
+        automaton = graph_types.GraphAutomaton()
+        automaton.add_transition('qa', 'r', ('qp',), set(), set(), set(['j+']))
+        automaton.add_transition('qp', 'a', (), set(), set(), set(['j-']))
+        automaton.add_transition('qp', 'b', (), set(), set(), set())
+        graph = graph_types.Graph()
+        graph.add_edge('A', 'r', ('P',))
+        graph.add_edge('P', 'a', ())
+
+        incremental = graph_incremental.IncrementalRun(automaton, graph, random.Random(0))
+        self.assertTrue(incremental.accepted)
+        self.assertFalse(incremental.replace_edge(_edge_of(graph, 'P'), 'b', ()))
+        self.assertIsNone(graph_run.automaton_table_run(automaton, graph))
+
+    def test_orphaned_child_waits_for_nothing(self):
+        automaton = _chain_automaton()
+        graph = graph_types.Graph()
+        graph.add_edge('A', 'f', ('B',))
+        graph.add_edge('B', 'f', ('C',))
+
+        incremental = graph_incremental.IncrementalRun(automaton, graph, random.Random(0))
+        self.assertFalse(incremental.accepted)  # C has no edge yet
+        self.assertFalse(incremental.remove_edge(_edge_of(graph, 'B')))
+        self.assertTrue(incremental.replace_edge(_edge_of(graph, 'A'), 'l', ()))
+        self.assertIsNotNone(graph_run.automaton_table_run(automaton, graph))
+
+    def test_edit_closing_cycle(self):
+        automaton = _chain_automaton()
+        graph = graph_types.Graph()
+        graph.add_edge('A', 'f', ('B',))
+        graph.add_edge('B', 'f', ('C',))
+        graph.add_edge('C', 'l', ())
+
+        incremental = graph_incremental.IncrementalRun(automaton, graph, random.Random(0))
+        self.assertTrue(incremental.accepted)
+        self.assertFalse(incremental.replace_edge(_edge_of(graph, 'C'), 'f', ('A',)))
+        self.assertTrue(incremental.replace_edge(_edge_of(graph, 'C'), 'l', ()))
+
+    def test_graph_without_edges(self):
+        incremental = graph_incremental.IncrementalRun(_chain_automaton(), graph_types.Graph())
+        self.assertFalse(incremental.accepted)
+
+    def test_cycle_closed_at_waiting_node(self):
+        # the edit closing R -> A -> R leaves A waiting for X, the cycle must still be
+        # found when X gets its edge
+        for f_vars in [(), ('x',)]:
+            automaton = _chain_automaton(f_vars)
+            graph = graph_types.Graph()
+            graph.add_edge('0', 'l', ())
+            graph.add_edge('R', 'f', ('A',))
+            graph.add_edge('A', 'l', ())
+
+            incremental = graph_incremental.IncrementalRun(automaton, graph, random.Random(0))
+            self.assertTrue(incremental.accepted)
+            self.assertFalse(incremental.replace_edge(_edge_of(graph, 'A'), 'g', ('R', 'X')))
+            self.assertFalse(incremental.add_edge('X', 'l', ()))
+            self.assertIsNone(graph_run.automaton_table_run(automaton, graph))
+            self.assertTrue(incremental.replace_edge(_edge_of(graph, 'A'), 'l', ()))
+
+    def test_edits_match_run_from_scratch(self):
+        for seed, f_vars in [(1, ()), (7, ('x',)), (8, ('x',))]:
+            automaton = _chain_automaton(f_vars)
+            rng = random.Random(seed)
+            graph = graph_types.Graph()
+            graph.add_edge('0', 'l', ())
+            incremental = graph_incremental.IncrementalRun(automaton, graph, random.Random(0))
+            for _ in range(300):
+                label = rng.choice(['f', 'g', 'l'])
+                children = tuple(str(rng.randrange(6)) for _ in range('lfg'.index(label)))
+                parent = str(rng.randrange(6))
+                if parent not in graph.nodes:
+                    accepted = incremental.add_edge(parent, label, children)
+                elif rng.random() < 0.2 and graph.edge_count() > 1:
+                    accepted = incremental.remove_edge(rng.randrange(graph.edge_count()))
+                else:
+                    accepted = incremental.replace_edge(rng.randrange(graph.edge_count()), label,
+                                                        children)
+                expected = graph_run.automaton_table_run(automaton, graph) is not None
+                self.assertEqual(accepted, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#! /usr/bin/python3
+
+import random
+import unittest
+
+import graph_numpy
+import graph_run
+import graph_types
+
+
+def _random_automaton(rng, states=3):
+    automaton = graph_types.GraphAutomaton()
+    names = ['q{}'.format(i) for i in range(states)]
+
+    def items(choices):
+        return set(rng.sample(choices, rng.randrange(len(choices) + 1)))
+
+    for symbol, arity in [('l', 0), ('f', 1), ('g', 2)]:
+        for _ in range(2 * states):
+            automaton.add_transition(rng.choice(names), symbol,
+                                     tuple(rng.choice(names) for _ in range(arity)),
+                                     items(['x', 'y']), items(['x', 'y']),
+                                     set(rng.choice([[]] * 6 + [['j+'], ['j-'], ['k+'], ['k-']])))
+    return automaton
+
+
+def _random_dag(rng, nodes=7):
+    # children are later nodes, the next one often among them, so shared children and
+    # one or several roots come up
+    graph = graph_types.Graph()
+    for node in range(nodes):
+        arity = 0 if node == nodes - 1 else rng.choice([0, 1, 2, 2])
+        children = [str(rng.randrange(node + 1, nodes)) for _ in range(arity)]
+        if arity > 0 and rng.random() < 0.7:
+            children[0] = str(node + 1)
+        graph.add_edge(str(node), 'lfg'[arity], tuple(children))
+    return graph
+
+
+@unittest.skipUnless(graph_numpy.available(), "numpy is not installed")
+class NumpyVerifiersTest(unittest.TestCase):
+    def test_same_results_as_python(self):
+        verify_connects, verify_jumps = graph_run.verifiers('python')
+        rng = random.Random(0)
+        checked = 0
+        while checked < 300:
+            automaton = _random_automaton(rng)
+            graph = _random_dag(rng)
+            try:
+                run = graph_run.label_run(automaton, graph, rng)
+            except graph_run.RunFailed:
+                continue
+            checked += 1
+            self.assertEqual(graph_numpy.verify_connects(graph, run),
+                             verify_connects(graph, run))
+            self.assertEqual(graph_numpy.verify_jumps(graph, run), verify_jumps(graph, run))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#! /usr/bin/python3
+
+import time
+import unittest
+
+import graph_parallel
+import graph_run
+import graph_types
+
+
+def _automaton():
+    automaton = graph_types.GraphAutomaton()
+    automaton.add_transition('q', 'f', ('q',), set(), set(), set())
+    automaton.add_transition('q', 'l', (), set(), set(), set())
+    return automaton
+
+
+def _graph(*edges):
+    graph = graph_types.Graph()
+    for parent, symbol, children in edges:
+        graph.add_edge(parent, symbol, children)
+    return graph
+
+
+class ParallelRunTest(unittest.TestCase):
+    def test_accepted(self):
+        graph = _graph(('A', 'f', ('B',)), ('B', 'l', ()))
+        result = graph_parallel.parallel_run(_automaton(), graph, workers=2, timeout=30)
+        self.assertEqual(result.status, 'accepted')
+        self.assertEqual(result.run.at('A').state, 'q')
+
+    def test_node_with_several_edges_is_rejected(self):
+        graph = _graph(('A', 'f', ('B',)), ('A', 'l', ()), ('B', 'l', ()))
+        result = graph_parallel.parallel_run(_automaton(), graph, workers=2)
+        self.assertEqual((result.status, result.attempts), ('rejected', 0))
+
+    def test_no_structural_run(self):
+        graph = _graph(('A', 'x', ('B',)), ('B', 'l', ()))
+        self.assertEqual(graph_parallel.parallel_run(_automaton(), graph, workers=2,
+                                                     propagate=True).status, 'rejected')
+        result = graph_parallel.parallel_run(_automaton(), graph, workers=2, attempts=100,
+                                             chunk=16)
+        self.assertEqual((result.status, result.attempts), ('unknown', 100))
+
+    def test_workers_stop_at_deadline(self):
+        graph = _graph(('A', 'x', ('B',)), ('B', 'l', ()))
+        result = graph_parallel.parallel_run(_automaton(), graph, workers=2, timeout=0.5)
+        self.assertEqual(result.status, 'unknown')
+        graph_parallel._init_worker(_automaton(), graph, None)
+        self.assertEqual(graph_parallel._run_attempts(0, 100, False, time.monotonic()),
+                         (None, 0, None))
+
+    def test_forest_components_checked_alone(self):
+        # the var x of p in the component of A is no source for the one of B, every path
+        # checks the components apart as forest_run does
+        automaton = graph_types.GraphAutomaton()
+        automaton.add_transition('p', 'f', ('c',), set(['x']), set(), set())
+        automaton.add_transition('c', 'f', ('l',), set(['x']), set(), set())
+        automaton.add_transition('p', 'f', ('l',), set(['x']), set(), set())
+        automaton.add_transition('l', 'l', (), set(), set(), set())
+        graph = _graph(('A', 'f', ('L',)), ('L', 'l', ()), ('B', 'f', ('C',)),
+                       ('C', 'f', ('L2',)), ('L2', 'l', ()))
+        expected = graph_parallel.forest_run(automaton, graph, workers=2).status == 'accepted'
+        self.assertEqual(graph_run.automaton_table_run(automaton, graph) is not None, expected)
+        self.assertEqual(graph_run.automaton_search(automaton, graph) is not None, expected)
+        self.assertEqual(graph_parallel.forest_run(automaton, graph, mode='search',
+                                                   workers=2).status == 'accepted', expected)
+
+    def test_batch_goes_past_bad_graphs(self):
+        lone = _graph(('A', 'l', ()))
+        lone.add_node('N')
+        graphs = [_graph(('A', 'l', ())), lone, graph_types.Graph(), _graph(('A', 'l', ()))]
+        results = list(graph_parallel.batch_run(_automaton(), graphs, workers=2, chunk=2))
+        self.assertEqual([(graph_id, accepted) for graph_id, accepted, _ in results],
+                         [(0, True), (1, False), (2, False), (3, True)])
+        self.assertEqual(results[1][2], "Node without an edge")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#! /usr/bin/python3
+
+import asyncio
+import unittest
+
+import graph_server
+
+_AUTOMATON = "q f q\nq l\n"
+_GRAPH = "A f B\nB l\n"
+
+
+def _chain(nodes):
+    return ''.join("{} f {}\n".format(i, i + 1) for i in range(nodes)) + "{} l\n".format(nodes)
+
+
+def _check_all(requests, workers=1):
+    async def check():
+        async with graph_server.CheckServer(workers) as server:
+            return await asyncio.gather(*[server.check(request) for request in requests])
+
+    return asyncio.run(check())
+
+
+class CheckServerTest(unittest.TestCase):
+    def test_modes(self):
+        responses = _check_all([{'id': mode, 'automaton': _AUTOMATON, 'graph': _GRAPH,
+                                 'mode': mode} for mode in ['random', 'table', 'search']])
+        self.assertEqual([response['status'] for response in responses], ['accepted'] * 3)
+        self.assertEqual(responses[1]['run']['A']['state'], 'q')
+
+    def test_errors(self):
+        responses = _check_all([{'id': 1, 'graph': _GRAPH, 'digest': 'missing'},
+                                {'id': 2, 'automaton': _AUTOMATON, 'graph': _GRAPH,
+                                 'mode': 'fast'},
+                                {'id': 3, 'automaton': _AUTOMATON, 'graph': _GRAPH,
+                                 'attempts': 'many'},
+                                {'id': 4, 'automaton': "q l | | | j\n", 'graph': _GRAPH}])
+        self.assertEqual([response['status'] for response in responses], ['error'] * 4)
+        self.assertTrue(responses[3]['error'].startswith("Malformed transition on line 1"))
+
+    def test_timed_out_search_frees_worker(self):
+        # every labelling of the chain fails its connects, the search would go through
+        # all of them if the worker did not stop it at the deadline
+        failing = "q f q | x\nq f p | x\np f q | x\np f p | x\nq l | x\np l | x\n"
+        responses = _check_all([{'id': 1, 'automaton': failing, 'graph': _chain(40),
+                                 'mode': 'search', 'timeout': 0.5},
+                                {'id': 2, 'automaton': _AUTOMATON, 'graph': _GRAPH,
+                                 'mode': 'table', 'timeout': 5}])
+        self.assertEqual([response['status'] for response in responses],
+                         ['timeout', 'accepted'])
+
+
+if __name__ == '__main__':
+    unittest.main()